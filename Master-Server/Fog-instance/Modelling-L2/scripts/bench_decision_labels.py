@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark decision labelling in the fog scorer:
+- row-wise DataFrame.apply path (detect_issue / issue_confidence / action_from_issue_and_risk)
+- columnar label_decisions path used by _score_batch
+
+Both paths are checked for identical output before timings are reported.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from fog_influx_logreg_pipeline import (  # noqa: E402
+    IMAGE_COLS,
+    action_from_issue_and_risk,
+    detect_issue,
+    issue_confidence,
+    label_decisions,
+)
+
+
+def _synthetic_frame(rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({c: rng.random(rows) for c in IMAGE_COLS})
+    df["node_id"] = [f"rtu-{i % 500}" for i in range(rows)]
+    df["node_risk"] = rng.random(rows)
+    return df
+
+
+def _rowwise(df: pd.DataFrame, high_thr: float, critical_thr: float) -> pd.DataFrame:
+    out = df.copy()
+    out["dominant_issue"] = out.apply(detect_issue, axis=1)
+    out["issue_confidence"] = out.apply(lambda r: issue_confidence(r, r["dominant_issue"]), axis=1)
+    action_cols = out.apply(
+        lambda r: action_from_issue_and_risk(
+            issue=r["dominant_issue"],
+            risk=float(r["node_risk"]),
+            high_thr=high_thr,
+            critical_thr=critical_thr,
+        ),
+        axis=1,
+        result_type="expand",
+    )
+    return pd.concat([out, action_cols], axis=1)
+
+
+def _columnar(df: pd.DataFrame, high_thr: float, critical_thr: float) -> pd.DataFrame:
+    labels = label_decisions(df, df["node_risk"].to_numpy(), high_thr, critical_thr)
+    return pd.concat([df, labels], axis=1)
+
+
+def _rate(fn, df: pd.DataFrame, repeats: int, high_thr: float, critical_thr: float) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(df, high_thr, critical_thr)
+        best = min(best, time.perf_counter() - started)
+    return len(df) / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark fog decision labelling")
+    parser.add_argument("--rows", default="1000,10000,100000", help="Comma-separated batch sizes")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--high", type=float, default=0.6)
+    parser.add_argument("--critical", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} | {'apply rows/s':>14} | {'columnar rows/s':>16} | {'speedup':>8}")
+    for rows in [int(r) for r in args.rows.split(",") if r.strip()]:
+        df = _synthetic_frame(rows, args.seed)
+        pd.testing.assert_frame_equal(
+            _rowwise(df, args.high, args.critical),
+            _columnar(df, args.high, args.critical),
+            check_dtype=False,
+        )
+        before = _rate(_rowwise, df, args.repeats, args.high, args.critical)
+        after = _rate(_columnar, df, args.repeats, args.high, args.critical)
+        print(f"{rows:>8} | {before:>14,.0f} | {after:>16,.0f} | {after / before:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Export the fitted logistic-regression pipeline to the NumPy kernel:
+- extract scaler mean/scale, coefficients and intercept into a JSON file,
+  together with the sha256 of the source .joblib
+- check the kernel's risk against sklearn's predict_proba on synthetic rows
+- report per-batch latency of both paths
+
+Nothing is written if the two disagree by more than --tolerance.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from logreg_kernel import LogRegKernel, load_kernel, model_digest, save_kernel  # noqa: E402
+
+
+def _synthetic_rows(kernel: LogRegKernel, rows: int, seed: int) -> np.ndarray:
+    """Rows spread well past the training distribution (+-6 sigma) so saturated risks are covered too."""
+    rng = np.random.default_rng(seed)
+    return kernel.mean + kernel.scale * rng.uniform(-6.0, 6.0, size=(rows, len(kernel.feature_cols)))
+
+
+def _latency(fn, X: np.ndarray, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    root = Path(__file__).resolve().parents[1]
+    parser = argparse.ArgumentParser(description="Export the logreg pipeline to a NumPy kernel")
+    parser.add_argument("--model", type=Path, default=root / "models/logreg_risk_model.joblib")
+    parser.add_argument("--config", type=Path, default=root / "models/model_config.json")
+    parser.add_argument("--out", type=Path, default=root / "models/logreg_kernel.json")
+    parser.add_argument("--rows", type=int, default=100000, help="Synthetic rows used for the equivalence check")
+    parser.add_argument("--batches", default="1,10,100,1000,10000", help="Comma-separated batch sizes to time")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with args.config.open("r", encoding="utf-8") as f:
+        feature_cols = json.load(f)["feature_cols"]
+    pipeline = joblib.load(args.model)
+    kernel = LogRegKernel.from_pipeline(pipeline, feature_cols)
+    kernel.source_sha256 = model_digest(args.model)
+
+    X = _synthetic_rows(kernel, args.rows, args.seed)
+    expected = pipeline.predict_proba(X)[:, 1]
+    got = kernel.predict_risk(X)
+    max_diff = float(np.max(np.abs(expected - got)))
+    print(f"max |sklearn - kernel| over {args.rows:,} rows: {max_diff:.3e}")
+    if max_diff > args.tolerance:
+        raise SystemExit(f"kernel disagrees with sklearn by {max_diff:.3e} (> {args.tolerance:.1e}); not exported")
+
+    save_kernel(kernel, args.out)
+    if not np.array_equal(load_kernel(args.out).predict_risk(X), got):
+        raise SystemExit(f"{args.out} does not round-trip")
+    print(f"Wrote {args.out}")
+
+    print(f"{'batch':>8} | {'sklearn us':>11} | {'kernel us':>10} | {'speedup':>8}")
+    for rows in [int(r) for r in args.batches.split(",") if r.strip()]:
+        batch = X[:rows]
+        before = _latency(pipeline.predict_proba, batch, args.repeats)
+        after = _latency(kernel.predict_proba, batch, args.repeats)
+        print(f"{rows:>8} | {before * 1e6:>11,.1f} | {after * 1e6:>10,.1f} | {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,16 +15,23 @@ import argparse
 import json
 import logging
 import os
+import queue
+import threading
 import time
 import uuid
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
 
-import joblib
+import numpy as np
 import pandas as pd
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client import InfluxDBClient, WriteOptions, WritePrecision
+from influxdb_client.client.write_api import WriteType
+
+from logreg_kernel import load_kernel, model_digest
 
 IMAGE_COLS = [
     "img_dusty_score",
@@ -43,6 +50,38 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--influx-token", default=os.getenv("INFLUXDB_TOKEN"), help="InfluxDB API token")
     parser.add_argument("--influx-org", default=os.getenv("INFLUXDB_ORG"), help="InfluxDB org name")
 
+    parser.add_argument(
+        "--source",
+        default=os.getenv("FOG_SOURCE", "influx"),
+        choices=["influx", "mqtt"],
+        help="influx: poll the input bucket; mqtt: score payloads pushed to --mqtt-topic as they arrive",
+    )
+    parser.add_argument("--mqtt-host", default=os.getenv("MQTT_BROKER", "localhost"))
+    parser.add_argument("--mqtt-port", type=int, default=int(os.getenv("MQTT_PORT", "1883")))
+    parser.add_argument("--mqtt-topic", default=os.getenv("MQTT_TOPIC", "solar/rtu/#"))
+    parser.add_argument("--mqtt-qos", type=int, default=1, choices=[0, 1, 2])
+    parser.add_argument("--mqtt-client-id", default=os.getenv("MQTT_CLIENT_ID", f"fog-scorer-{uuid.uuid4().hex[:8]}"))
+    parser.add_argument("--mqtt-username", default=os.getenv("MQTT_USERNAME", ""))
+    parser.add_argument("--mqtt-password", default=os.getenv("MQTT_PASSWORD", ""))
+    parser.add_argument(
+        "--mqtt-batch-size",
+        type=int,
+        default=int(os.getenv("FOG_MQTT_BATCH_SIZE", "500")),
+        help="Maximum payloads scored together in one micro-batch",
+    )
+    parser.add_argument(
+        "--mqtt-batch-wait-ms",
+        type=int,
+        default=int(os.getenv("FOG_MQTT_BATCH_WAIT_MS", "200")),
+        help="Maximum time a micro-batch stays open after its first payload",
+    )
+    parser.add_argument(
+        "--mqtt-queue-size",
+        type=int,
+        default=int(os.getenv("FOG_MQTT_QUEUE_SIZE", "50000")),
+        help="Payloads buffered between the MQTT callback and the scorer before new ones are dropped",
+    )
+
     parser.add_argument("--input-bucket", default=os.getenv("INFLUX_INPUT_BUCKET", "metrics"))
     parser.add_argument("--output-bucket", default=os.getenv("INFLUX_OUTPUT_BUCKET", "inferences"))
 
@@ -60,6 +99,12 @@ def parse_args() -> argparse.Namespace:
     )
 
     parser.add_argument("--model", type=Path, default=Path("models/logreg_risk_model.joblib"))
+    parser.add_argument(
+        "--kernel",
+        type=Path,
+        default=Path(os.getenv("FOG_MODEL_KERNEL", "models/logreg_kernel.json")),
+        help="NumPy export of --model (scripts/export_logreg_kernel.py); used instead of sklearn when present",
+    )
     parser.add_argument("--config", type=Path, default=Path("models/model_config.json"))
 
     parser.add_argument(
@@ -68,12 +113,35 @@ def parse_args() -> argparse.Namespace:
         help="Optional node_id tag filter for the input query",
     )
 
-    parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds between polling Influx")
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=5.0,
+        help="Seconds between polling Influx (mqtt source: seconds between checkpoint saves)",
+    )
     parser.add_argument(
         "--bootstrap-lookback-minutes",
         type=float,
         default=10.0,
-        help="Initial lookback range when script starts",
+        help="Initial lookback range when no checkpoint exists",
+    )
+    parser.add_argument(
+        "--checkpoint-file",
+        type=Path,
+        default=Path(os.getenv("FOG_CHECKPOINT_FILE", "state/fog_checkpoint.json")),
+        help="Local file holding the newest processed _time per node; polling resumes from it after restart",
+    )
+    parser.add_argument(
+        "--allowed-lateness-seconds",
+        type=float,
+        default=float(os.getenv("FOG_ALLOWED_LATENESS_SECONDS", "30")),
+        help="Overlap re-queried behind the watermark so late points are still scored once",
+    )
+    parser.add_argument(
+        "--max-node-lag-minutes",
+        type=float,
+        default=float(os.getenv("FOG_MAX_NODE_LAG_MINUTES", "60")),
+        help="How far a node's watermark may trail the newest one and still be re-queried; older gaps need --backfill",
     )
     parser.add_argument(
         "--alpha",
@@ -95,6 +163,51 @@ def parse_args() -> argparse.Namespace:
         help="Comma-separated columns preserved as Influx tags in output",
     )
 
+    parser.add_argument(
+        "--write-batch-size",
+        type=int,
+        default=int(os.getenv("FOG_WRITE_BATCH_SIZE", "5000")),
+        help="Points per Influx write request; scored frames are chunked to this size",
+    )
+    parser.add_argument(
+        "--write-flush-interval-ms",
+        type=int,
+        default=int(os.getenv("FOG_WRITE_FLUSH_INTERVAL_MS", "1000")),
+        help="Maximum time a partial batch waits before it is flushed",
+    )
+    parser.add_argument(
+        "--write-max-retries",
+        type=int,
+        default=int(os.getenv("FOG_WRITE_MAX_RETRIES", "5")),
+        help="Retries for a failed batch before it is dropped and logged",
+    )
+
+    parser.add_argument(
+        "--query-chunk-rows",
+        type=int,
+        default=int(os.getenv("FOG_QUERY_CHUNK_ROWS", "50000")),
+        help="Stream query results and score/write them in chunks of this many rows (0 = load the window at once)",
+    )
+
+    parser.add_argument(
+        "--backfill",
+        nargs=2,
+        metavar=("START", "END"),
+        help="Re-score [START, END) (ISO times or 'now') in time slices, write the results and exit",
+    )
+    parser.add_argument(
+        "--backfill-slice-minutes",
+        type=float,
+        default=float(os.getenv("FOG_BACKFILL_SLICE_MINUTES", "60")),
+        help="Width of each backfill slice; one site summary point is written per slice",
+    )
+    parser.add_argument(
+        "--backfill-workers",
+        type=int,
+        default=int(os.getenv("FOG_BACKFILL_WORKERS", "4")),
+        help="Slices queried and scored concurrently during a backfill",
+    )
+
     parser.add_argument("--once", action="store_true", help="Process one polling window and exit")
     parser.add_argument("--dry-run", action="store_true", help="Run inference without writing to Influx")
     parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
@@ -109,6 +222,15 @@ def parse_args() -> argparse.Namespace:
         raise ValueError("Missing Influx org. Use --influx-org or INFLUX_ORG")
     if not args.site_id:
         args.site_id = f"site-{uuid.uuid4()}"
+    if args.backfill:
+        if args.source != "influx":
+            raise ValueError("--backfill reads from Influx; it cannot be combined with --source mqtt")
+        start, end = (pd.to_datetime(value, utc=True) for value in args.backfill)
+        if end <= start:
+            raise ValueError("--backfill END must be after START")
+        if args.backfill_slice_minutes <= 0:
+            raise ValueError("--backfill-slice-minutes must be positive")
+        args.backfill = (start.to_pydatetime(), end.to_pydatetime())
 
     return args
 
@@ -134,6 +256,18 @@ def issue_confidence(row: pd.Series, issue: str) -> float:
     return float(row[key])
 
 
+ISSUE_ACTIONS = {
+    "dusty": "Cleaning recommended",
+    "bird_drop": "Spot cleaning + inspect recurring droppings",
+    "cracked": "Panel inspection and likely replacement",
+    "panel": "Electrical inspection (possible non-visual anomaly)",
+    "hotspot": "Immediate thermal inspection",
+    "unknown": "Manual inspection recommended",
+}
+
+MONITOR_RISK = 0.4
+
+
 def action_from_issue_and_risk(issue: str, risk: float, high_thr: float, critical_thr: float) -> Dict[str, str]:
     if risk >= critical_thr:
         severity = "critical"
@@ -141,14 +275,14 @@ def action_from_issue_and_risk(issue: str, risk: float, high_thr: float, critica
     elif risk >= high_thr:
         severity = "high"
         priority = "P2"
-    elif risk >= 0.4:
+    elif risk >= MONITOR_RISK:
         severity = "medium"
         priority = "P3"
     else:
         severity = "low"
         priority = "P4"
 
-    if risk < 0.4:
+    if risk < MONITOR_RISK:
         return {
             "severity": severity,
             "priority": priority,
@@ -156,15 +290,7 @@ def action_from_issue_and_risk(issue: str, risk: float, high_thr: float, critica
             "maintenance_window": "Routine",
         }
 
-    issue_actions = {
-        "dusty": "Cleaning recommended",
-        "bird_drop": "Spot cleaning + inspect recurring droppings",
-        "cracked": "Panel inspection and likely replacement",
-        "panel": "Electrical inspection (possible non-visual anomaly)",
-        "hotspot": "Immediate thermal inspection",
-        "unknown": "Manual inspection recommended",
-    }
-    action = issue_actions.get(issue, issue_actions["unknown"])
+    action = ISSUE_ACTIONS.get(issue, ISSUE_ACTIONS["unknown"])
     window = "Immediate" if severity == "critical" else "Within 3 months" if severity == "high" else "This week"
     return {
         "severity": severity,
@@ -174,6 +300,65 @@ def action_from_issue_and_risk(issue: str, risk: float, high_thr: float, critica
     }
 
 
+def label_decisions(df: pd.DataFrame, risk: np.ndarray, high_thr: float, critical_thr: float) -> pd.DataFrame:
+    """Columnar equivalent of detect_issue/issue_confidence/action_from_issue_and_risk.
+
+    Returns dominant_issue, issue_confidence, severity, priority, action and
+    maintenance_window aligned to df.index, matching the row-wise helpers.
+    """
+    n = len(df)
+    risk = np.asarray(risk, dtype=float)
+
+    available = [c for c in IMAGE_COLS if c in df.columns]
+    if available:
+        scores = np.column_stack(
+            [pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float) for c in available]
+        )
+        # Same tie/NaN semantics as max(dict): first column wins unless a later one is strictly greater.
+        best_idx = np.zeros(n, dtype=np.intp)
+        best = scores[:, 0].copy()
+        for i in range(1, scores.shape[1]):
+            greater = scores[:, i] > best
+            best_idx[greater] = i
+            best[greater] = scores[greater, i]
+        names = np.array([c.replace("img_", "").replace("_score", "") for c in available], dtype=object)
+        dominant = names[best_idx]
+        confidence = best
+    else:
+        dominant = np.full(n, "unknown", dtype=object)
+        confidence = np.zeros(n, dtype=float)
+
+    is_critical = risk >= critical_thr
+    is_high = risk >= high_thr
+    is_medium = risk >= MONITOR_RISK
+    severity = np.select([is_critical, is_high, is_medium], ["critical", "high", "medium"], default="low")
+    priority = np.select([is_critical, is_high, is_medium], ["P1", "P2", "P3"], default="P4")
+
+    # Codes index ISSUE_ACTIONS in order; issues outside it get -1, which lands on the trailing "unknown" entry.
+    issue_codes = pd.Categorical(dominant, categories=list(ISSUE_ACTIONS))
+    action_table = np.array(list(ISSUE_ACTIONS.values()) + [ISSUE_ACTIONS["unknown"]], dtype=object)
+    issue_action = action_table[issue_codes.codes]
+
+    window = np.select(
+        [severity == "critical", severity == "high"],
+        ["Immediate", "Within 3 months"],
+        default="This week",
+    )
+    monitor = risk < MONITOR_RISK
+
+    return pd.DataFrame(
+        {
+            "dominant_issue": dominant,
+            "issue_confidence": confidence,
+            "severity": severity.astype(object),
+            "priority": priority.astype(object),
+            "action": np.where(monitor, "Monitor only", issue_action).astype(object),
+            "maintenance_window": np.where(monitor, "Routine", window).astype(object),
+        },
+        index=df.index,
+    )
+
+
 def _iso_utc(dt: datetime) -> str:
     return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
 
@@ -189,12 +374,14 @@ def _concat_query_frames(raw: object) -> pd.DataFrame:
     return pd.DataFrame()
 
 
+QUERY_META_COLS = ["result", "table", "_start", "_stop"]
+
+
 def _to_wide(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return df
 
-    drop_meta = ["result", "table", "_start", "_stop"]
-    for col in drop_meta:
+    for col in QUERY_META_COLS:
         if col in df.columns:
             df = df.drop(columns=col)
 
@@ -249,18 +436,45 @@ from(bucket: "{bucket}")
 '''.strip()
 
 
+def _site_stats(scored_df: pd.DataFrame) -> Dict[str, object]:
+    """Mergeable aggregates of a scored frame, enough to build one site summary."""
+    return {
+        "risk_sum": float(scored_df["node_risk"].sum()),
+        "rows": int(len(scored_df)),
+        "peak": float(scored_df["node_risk"].max()),
+        "nodes": (
+            set(scored_df[RAW_NODE_ID_COL].dropna().astype(str))
+            if RAW_NODE_ID_COL in scored_df.columns
+            else None
+        ),
+        "issues": Counter(scored_df["dominant_issue"].dropna().tolist()),
+    }
+
+
+def _merge_site_stats(total: Optional[Dict[str, object]], part: Dict[str, object]) -> Dict[str, object]:
+    if total is None:
+        return part
+    return {
+        "risk_sum": total["risk_sum"] + part["risk_sum"],
+        "rows": total["rows"] + part["rows"],
+        "peak": max(total["peak"], part["peak"]),
+        "nodes": None if total["nodes"] is None or part["nodes"] is None else total["nodes"] | part["nodes"],
+        "issues": total["issues"] + part["issues"],
+    }
+
+
 def _compute_site_summary_l2(
-    scored_df: pd.DataFrame,
+    stats: Optional[Dict[str, object]],
     site_risk_history: Dict[str, List[float]],
     alpha: float,
     trend_window_size: int,
     site_id: str,
 ) -> pd.DataFrame:
-    if scored_df.empty:
+    if not stats or not stats["rows"]:
         return pd.DataFrame()
 
     trend_window_size = max(2, int(trend_window_size))
-    rs_now = float(scored_df["node_risk"].mean())
+    rs_now = float(stats["risk_sum"] / stats["rows"])
     key = str(site_id)
     site_risk_history.setdefault(key, []).append(rs_now)
     site_risk_history[key] = site_risk_history[key][-trend_window_size:]
@@ -268,11 +482,7 @@ def _compute_site_summary_l2(
 
     rs_prev = float(sum(hist[:-1]) / max(1, len(hist) - 1)) if len(hist) > 1 else rs_now
     d_rs_dt = float((hist[-1] - hist[0]) / max(1, len(hist) - 1)) if len(hist) > 1 else 0.0
-    node_count = (
-        int(scored_df[RAW_NODE_ID_COL].nunique())
-        if RAW_NODE_ID_COL in scored_df.columns
-        else int(len(scored_df))
-    )
+    node_count = len(stats["nodes"]) if stats["nodes"] is not None else int(stats["rows"])
 
     summary = {
         "site": key,
@@ -280,13 +490,13 @@ def _compute_site_summary_l2(
         "Rs_prev": rs_prev,
         "Rs_smoothed": alpha * rs_now + (1.0 - alpha) * rs_prev,
         "dRs_dt": d_rs_dt,
-        "Rs_peak": float(scored_df["node_risk"].max()),
+        "Rs_peak": float(stats["peak"]),
         "nodes": node_count,
     }
 
-    issue_share = scored_df["dominant_issue"].value_counts(normalize=True)
-    for issue_name, share in issue_share.items():
-        summary[str(issue_name)] = float(share)
+    issue_total = sum(stats["issues"].values())
+    for issue_name, count in stats["issues"].most_common():
+        summary[str(issue_name)] = float(count / issue_total)
 
     return pd.DataFrame([summary])
 
@@ -298,6 +508,46 @@ def _cast_and_filter_features(df: pd.DataFrame, feature_cols: List[str]) -> pd.D
     return typed.dropna(subset=feature_cols).copy()
 
 
+SITE_FIELD_COLS = ["Rs_now", "Rs_prev", "Rs_smoothed", "dRs_dt", "Rs_peak", "nodes"]
+
+
+def _write_frame(
+    write_api,
+    org: str,
+    bucket: str,
+    measurement: str,
+    frame: pd.DataFrame,
+    tag_cols: List[str],
+) -> int:
+    if frame.empty:
+        return 0
+
+    missing = frame[tag_cols].isna()
+    if not missing.to_numpy().any():
+        parts = [(frame, tag_cols)]
+    else:
+        # The client only escapes ",= " in tag columns without nulls, so rows missing a tag
+        # are written separately with that column dropped.
+        parts = []
+        for key, part in frame.groupby([missing[c] for c in tag_cols], sort=False):
+            key = key if isinstance(key, tuple) else (key,)
+            null_tags = [c for c, is_null in zip(tag_cols, key) if is_null]
+            kept_tags = [c for c in tag_cols if c not in null_tags]
+            parts.append((part.drop(columns=null_tags), kept_tags))
+
+    for part, part_tags in parts:
+        write_api.write(
+            bucket=bucket,
+            org=org,
+            record=part,
+            write_precision=WritePrecision.NS,
+            data_frame_measurement_name=measurement,
+            data_frame_tag_columns=part_tags,
+            data_frame_timestamp_column="_time",
+        )
+    return len(frame)
+
+
 def _write_node_points(
     write_api,
     org: str,
@@ -306,29 +556,24 @@ def _write_node_points(
     rows: pd.DataFrame,
     tag_cols: List[str],
 ) -> int:
-    points: List[Point] = []
-    for _, row in rows.iterrows():
-        ts = row["_time"] if "_time" in row.index else datetime.now(timezone.utc)
-        point = Point(measurement).time(ts, WritePrecision.NS)
-
-        for tag in tag_cols:
-            if tag in row.index and pd.notna(row[tag]):
-                point = point.tag(tag, str(row[tag]))
+    present_tags = [tag for tag in tag_cols if tag in rows.columns]
+    frame = pd.DataFrame(index=rows.index)
+    if "_time" in rows.columns:
+        frame["_time"] = pd.to_datetime(rows["_time"], utc=True)
+    else:
+        frame["_time"] = pd.Timestamp.now(tz="UTC")
 
-        point = point.field("node_risk", float(row["node_risk"]))
-        point = point.field("binary_fault", int(row["binary_fault"]))
-        point = point.field("dominant_issue", str(row["dominant_issue"]))
-        point = point.field("issue_confidence", float(row["issue_confidence"]))
-        point = point.field("severity", str(row["severity"]))
-        point = point.field("priority", str(row["priority"]))
-        point = point.field("action", str(row["action"]))
-        point = point.field("maintenance_window", str(row["maintenance_window"]))
+    for tag in present_tags:
+        frame[tag] = rows[tag].astype(str).where(rows[tag].notna(), None)
 
-        points.append(point)
+    frame["node_risk"] = rows["node_risk"].astype(float)
+    frame["binary_fault"] = rows["binary_fault"].astype("int64")
+    frame["dominant_issue"] = rows["dominant_issue"].astype(str)
+    frame["issue_confidence"] = rows["issue_confidence"].astype(float)
+    for col in ["severity", "priority", "action", "maintenance_window"]:
+        frame[col] = rows[col].astype(str)
 
-    if points:
-        write_api.write(bucket=bucket, org=org, record=points)
-    return len(points)
+    return _write_frame(write_api, org, bucket, measurement, frame, present_tags)
 
 
 def _write_site_points(
@@ -339,30 +584,92 @@ def _write_site_points(
     site_df: pd.DataFrame,
     event_time: datetime,
 ) -> int:
-    points: List[Point] = []
-    for _, row in site_df.iterrows():
-        point = Point(measurement).time(event_time, WritePrecision.NS)
-        point = point.tag("site", str(row.get("site", "single_site")))
+    if site_df.empty:
+        return 0
+
+    frame = pd.DataFrame(index=site_df.index)
+    frame["_time"] = pd.Timestamp(event_time).tz_convert("UTC")
+    frame["site"] = site_df["site"].astype(str) if "site" in site_df.columns else "single_site"
+
+    frame["Rs_now"] = site_df["Rs_now"].astype(float)
+    frame["Rs_prev"] = site_df.get("Rs_prev", site_df["Rs_now"]).astype(float)
+    frame["Rs_smoothed"] = site_df.get("Rs_smoothed", site_df["Rs_now"]).astype(float)
+    frame["dRs_dt"] = site_df.get("dRs_dt", pd.Series(0.0, index=site_df.index)).astype(float)
+    frame["Rs_peak"] = site_df["Rs_peak"].astype(float)
+    frame["nodes"] = site_df["nodes"].astype("int64")
+
+    for col in site_df.columns:
+        if col == "site" or col in SITE_FIELD_COLS:
+            continue
+        frame[f"issue_share_{col}"] = pd.to_numeric(site_df[col], errors="coerce").astype(float)
+
+    return _write_frame(write_api, org, bucket, measurement, frame, ["site"])
+
+
+class TrackedWriteApi:
+    """
+    Batching write_api that counts how many submitted points Influx has acked.
+
+    The client writes batches one at a time on a single thread, in submission
+    order, so once acked reaches the number of points submitted before some
+    moment, every point up to that moment is stored.
+    """
+
+    def __init__(self, client: InfluxDBClient, options: WriteOptions) -> None:
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._acked = 0
+        self._failed = 0
+        self._write_api = client.write_api(
+            write_options=options,
+            success_callback=self._on_success,
+            error_callback=self._on_error,
+            retry_callback=self._on_retry,
+        )
+
+    def write(self, *, record: pd.DataFrame, **kwargs) -> None:
+        with self._lock:
+            self._submitted += len(record)
+        self._write_api.write(record=record, **kwargs)
+
+    def counts(self) -> Tuple[int, int, int]:
+        """(submitted, acked, failed) points so far."""
+        with self._lock:
+            return self._submitted, self._acked, self._failed
+
+    def close(self) -> None:
+        """Flush pending batches and wait for their callbacks; safe to call twice."""
+        self._write_api.close()
 
-        point = point.field("Rs_now", float(row["Rs_now"]))
-        point = point.field("Rs_prev", float(row.get("Rs_prev", row["Rs_now"])))
-        point = point.field("Rs_smoothed", float(row.get("Rs_smoothed", row["Rs_now"])))
-        point = point.field("dRs_dt", float(row.get("dRs_dt", 0.0)))
-        point = point.field("Rs_peak", float(row["Rs_peak"]))
-        point = point.field("nodes", int(row["nodes"]))
+    def __enter__(self) -> "TrackedWriteApi":
+        return self
 
-        for col in site_df.columns:
-            if col in {"site", "Rs_now", "Rs_prev", "Rs_smoothed", "dRs_dt", "Rs_peak", "nodes"}:
-                continue
-            value = row[col]
-            if pd.notna(value):
-                point = point.field(f"issue_share_{col}", float(value))
+    def __exit__(self, *exc) -> None:
+        self.close()
 
-        points.append(point)
+    def _on_success(self, conf, data: bytes) -> None:
+        with self._lock:
+            self._acked += data.count(b"\n") + 1
 
-    if points:
-        write_api.write(bucket=bucket, org=org, record=points)
-    return len(points)
+    def _on_error(self, conf, data: bytes, exc) -> None:
+        logging.error("Influx batch write failed for %s: %s", conf, exc)
+        with self._lock:
+            self._failed += data.count(b"\n") + 1
+
+    def _on_retry(self, conf, data: bytes, exc) -> None:
+        logging.warning("Retrying Influx batch write for %s: %s", conf, exc)
+
+
+def _open_write_api(client: InfluxDBClient, args: argparse.Namespace) -> TrackedWriteApi:
+    """Batching write_api: frames are chunked by --write-batch-size and flushed in the background."""
+    options = WriteOptions(
+        write_type=WriteType.batching,
+        batch_size=max(1, args.write_batch_size),
+        flush_interval=max(1, args.write_flush_interval_ms),
+        jitter_interval=0,
+        max_retries=max(0, args.write_max_retries),
+    )
+    return TrackedWriteApi(client, options)
 
 
 def _score_batch(
@@ -383,27 +690,265 @@ def _score_batch(
     clean["node_risk"] = model.predict_proba(X)[:, 1]
     clean["binary_fault"] = (clean["node_risk"] >= threshold).astype(int)
 
-    clean["dominant_issue"] = clean.apply(detect_issue, axis=1)
-    clean["issue_confidence"] = clean.apply(lambda r: issue_confidence(r, r["dominant_issue"]), axis=1)
-
-    action_cols = clean.apply(
-        lambda r: action_from_issue_and_risk(
-            issue=r["dominant_issue"],
-            risk=float(r["node_risk"]),
-            high_thr=high_thr,
-            critical_thr=critical_thr,
-        ),
-        axis=1,
-        result_type="expand",
-    )
-
-    return pd.concat([clean, action_cols], axis=1)
+    labels = label_decisions(clean, clean["node_risk"].to_numpy(), high_thr, critical_thr)
+    return pd.concat([clean, labels], axis=1)
 
 
 def _safe_tag_cols(raw: str) -> List[str]:
     return [s.strip() for s in raw.split(",") if s.strip()]
 
 
+class Watermarks:
+    """
+    Per-node processing state.
+
+    marks[node_id] is the newest processed _time of that node. seen holds the
+    (node_id, _time ns) keys processed within allowed_lateness of it. A row is
+    new if its _time is after marks - allowed_lateness and its key is not in
+    seen, so late points inside the re-queried overlap are scored exactly once.
+    """
+
+    def __init__(self, allowed_lateness: timedelta = timedelta(0)) -> None:
+        self.allowed_lateness = pd.Timedelta(allowed_lateness)
+        self.marks: Dict[str, pd.Timestamp] = {}
+        self.seen: set = set()
+
+    def __len__(self) -> int:
+        return len(self.marks)
+
+    def newest(self) -> pd.Timestamp:
+        return max(self.marks.values())
+
+    def oldest(self) -> pd.Timestamp:
+        return min(self.marks.values())
+
+    def floors(self) -> Dict[str, pd.Timestamp]:
+        """Per node, the _time at or before which rows are no longer accepted."""
+        return {node_id: ts - self.allowed_lateness for node_id, ts in self.marks.items()}
+
+    def copy(self) -> "Watermarks":
+        other = Watermarks(self.allowed_lateness)
+        other.marks = dict(self.marks)
+        other.seen = set(self.seen)
+        return other
+
+    def restore(self, other: "Watermarks") -> None:
+        self.marks = dict(other.marks)
+        self.seen = set(other.seen)
+
+    def _prune(self) -> None:
+        floors = self.floors()
+        self.seen = {key for key in self.seen if key[1] > floors[key[0]].value}
+
+
+def _per_node(nodes: pd.Series, values: Dict[str, pd.Timestamp]) -> pd.Series:
+    if not values:
+        return pd.Series(pd.NaT, index=nodes.index, dtype="datetime64[ns, UTC]")
+    return nodes.map(pd.Series(values, dtype="datetime64[ns, UTC]"))
+
+
+def _time_ns(times: pd.Series) -> pd.Series:
+    return times.dt.as_unit("ns").astype("int64")
+
+
+def _load_checkpoint(path: Path, allowed_lateness: timedelta) -> Watermarks:
+    """Watermarks and recently processed keys from a previous run; empty if there is no checkpoint."""
+    watermarks = Watermarks(allowed_lateness)
+    if not path.exists():
+        return watermarks
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        logging.exception("Ignoring unreadable checkpoint %s", path)
+        return watermarks
+
+    for node_id, ts in (state.get("watermarks") or {}).items():
+        parsed = pd.to_datetime(ts, utc=True, errors="coerce")
+        if pd.notna(parsed):
+            watermarks.marks[str(node_id)] = parsed
+    for node_id, times in (state.get("seen") or {}).items():
+        if str(node_id) not in watermarks.marks:
+            continue
+        parsed = pd.to_datetime(pd.Series(times, dtype=object), utc=True, errors="coerce").dropna()
+        watermarks.seen.update((str(node_id), ns) for ns in _time_ns(parsed))
+    watermarks._prune()
+    return watermarks
+
+
+def _save_checkpoint(path: Path, watermarks: Watermarks) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    seen: Dict[str, List[str]] = {}
+    for node_id, ns in sorted(watermarks.seen):
+        seen.setdefault(node_id, []).append(pd.Timestamp(ns, unit="ns", tz="UTC").isoformat())
+    state = {
+        "updated": _iso_utc(datetime.now(timezone.utc)),
+        "watermarks": {node_id: ts.isoformat() for node_id, ts in sorted(watermarks.marks.items())},
+        "seen": seen,
+    }
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Checkpointer:
+    """
+    Saves watermarks only once the decisions behind them are stored in Influx.
+
+    mark() snapshots the watermarks with the number of points submitted so
+    far; a snapshot is written to disk once Influx has acked that many points.
+    A failed batch rolls the in-memory watermarks back to the last saved
+    checkpoint instead, so the affected rows are scored and written again.
+    """
+
+    def __init__(self, path: Path, write_api: TrackedWriteApi, watermarks: Watermarks, dry_run: bool = False) -> None:
+        self.path = path
+        self.write_api = write_api
+        self.watermarks = watermarks
+        self.dry_run = dry_run
+        self.saved = watermarks.copy()
+        self._pending: deque = deque()
+        self._failed = write_api.counts()[2]
+
+    def mark(self) -> None:
+        """Queue the current watermarks for saving and save whatever is already confirmed."""
+        if self.dry_run:
+            return
+        self._pending.append((self.write_api.counts()[0], self.watermarks.copy()))
+        self.commit()
+
+    def commit(self) -> None:
+        if self.dry_run:
+            return
+        submitted, acked, failed = self.write_api.counts()
+        if failed > self._failed:
+            logging.error(
+                "%d decision points failed to write; rolling watermarks back to checkpoint %s",
+                failed - self._failed,
+                self.path,
+            )
+            self._failed = failed
+            self._pending.clear()
+            self.watermarks.restore(self.saved)
+            return
+
+        # Failed points were handled above, so every settled point up to here was acked.
+        settled = acked + failed
+        confirmed = None
+        while self._pending and self._pending[0][0] <= settled:
+            confirmed = self._pending.popleft()[1]
+        if confirmed is not None:
+            _save_checkpoint(self.path, confirmed)
+            self.saved = confirmed
+        if self._pending:
+            logging.debug("Checkpoint waiting for %d of %d points to be acked", submitted - settled, submitted)
+
+    def close(self) -> None:
+        """Flush and close the write_api, then save what it confirmed."""
+        self.write_api.close()
+        self.commit()
+
+
+def _query_start(
+    watermarks: Watermarks,
+    allowed_lateness: timedelta,
+    bootstrap_lookback: timedelta,
+    now_ts: datetime,
+    max_node_lag: timedelta = timedelta(hours=1),
+) -> datetime:
+    """Start of the next poll window: the oldest node's floor, so lagging nodes are not skipped.
+
+    A node trailing the newest watermark by more than max_node_lag (e.g. one
+    that went offline) stops holding the window back; its older points are
+    left to --backfill.
+    """
+    if not watermarks:
+        return now_ts - bootstrap_lookback
+    newest = watermarks.newest().to_pydatetime()
+    oldest = max(watermarks.oldest().to_pydatetime(), newest - max_node_lag)
+    return min(oldest - allowed_lateness, now_ts)
+
+
+def _node_keys(df: pd.DataFrame) -> pd.Series:
+    if RAW_NODE_ID_COL in df.columns:
+        return df[RAW_NODE_ID_COL].astype(str)
+    return pd.Series("", index=df.index)
+
+
+def _drop_processed(
+    df: pd.DataFrame,
+    watermarks: Watermarks,
+    floors: Optional[Dict[str, pd.Timestamp]] = None,
+) -> pd.DataFrame:
+    """
+    Drop rows repeated in the batch, rows at or before their node's floor
+    (watermark - allowed_lateness, or the given floors) and (node_id, _time)
+    keys already processed.
+    """
+    if df.empty or "_time" not in df.columns:
+        return df
+
+    nodes = _node_keys(df)
+    df = df.loc[~pd.DataFrame({"node": nodes, "_time": df["_time"]}).duplicated(keep="last")]
+    if not watermarks:
+        return df
+
+    nodes = nodes.loc[df.index]
+    floor = _per_node(nodes, watermarks.floors() if floors is None else floors)
+    keep = floor.isna() | (df["_time"] > floor)
+    if watermarks.seen:
+        # Only rows inside the lateness overlap can have been processed already.
+        mark = _per_node(nodes, watermarks.marks)
+        overlap = keep & mark.notna() & (df["_time"] <= mark)
+        if overlap.any():
+            keys = zip(nodes[overlap], _time_ns(df.loc[overlap, "_time"]))
+            keep.loc[overlap] = [key not in watermarks.seen for key in keys]
+    return df.loc[keep]
+
+
+def _advance_watermarks(watermarks: Watermarks, df: pd.DataFrame) -> None:
+    """Record df's rows as processed and move each node's watermark forward."""
+    if df.empty or "_time" not in df.columns:
+        return
+    nodes = _node_keys(df)
+    newest = df["_time"].groupby(nodes).max()
+    for node_id, ts in newest.items():
+        current = watermarks.marks.get(node_id)
+        if current is None or ts > current:
+            watermarks.marks[node_id] = ts
+    watermarks.seen.update(zip(nodes, _time_ns(df["_time"])))
+    watermarks._prune()
+
+
+def _parse_times(df: pd.DataFrame) -> pd.DataFrame:
+    if "_time" in df.columns:
+        df["_time"] = pd.to_datetime(df["_time"], utc=True, errors="coerce")
+        df = df.dropna(subset=["_time"])
+    return df
+
+
+def _iter_query_chunks(query_api, flux: str, chunk_rows: int) -> Iterable[pd.DataFrame]:
+    """
+    Rows of an already pivoted query as frames of at most chunk_rows.
+
+    Records are pulled from the response stream only as each chunk is
+    built, so memory is bounded by chunk_rows, not by the window length.
+    """
+    records = query_api.query_stream(flux)
+    try:
+        while True:
+            batch = [record.values for record in islice(records, chunk_rows)]
+            if not batch:
+                return
+            frame = pd.DataFrame.from_records(batch)
+            yield frame.drop(columns=[c for c in QUERY_META_COLS if c in frame.columns])
+    finally:
+        records.close()
+
+
 def run_once(
     query_api,
     write_api,
@@ -415,6 +960,7 @@ def run_once(
     stop_ts: datetime,
     tag_cols: List[str],
     site_risk_history: Dict[str, List[float]],
+    watermarks: Watermarks,
 ) -> int:
     query_fields = list(dict.fromkeys(feature_cols + IMAGE_COLS + ["PR_DEV", "PR_SLOPE"]))
     flux = _build_flux_query_with_filters(
@@ -425,6 +971,21 @@ def run_once(
         node_id_filter=args.node_id_filter,
         field_filters=query_fields,
     )
+    if args.query_chunk_rows > 0:
+        return _run_chunked(
+            chunks=_iter_query_chunks(query_api, flux, args.query_chunk_rows),
+            write_api=write_api,
+            args=args,
+            model=model,
+            feature_cols=feature_cols,
+            threshold=threshold,
+            start_ts=start_ts,
+            stop_ts=stop_ts,
+            tag_cols=tag_cols,
+            site_risk_history=site_risk_history,
+            watermarks=watermarks,
+        )
+
     raw = query_api.query_data_frame(flux)
     long_df = _concat_query_frames(raw)
     wide_df = _to_wide(long_df)
@@ -433,48 +994,113 @@ def run_once(
         logging.info("No telemetry rows returned for window %s -> %s", _iso_utc(start_ts), _iso_utc(stop_ts))
         return 0
 
-    if "_time" in wide_df.columns:
-        wide_df["_time"] = pd.to_datetime(wide_df["_time"], utc=True, errors="coerce")
-        wide_df = wide_df.dropna(subset=["_time"]).copy()
+    return _process_wide_frame(
+        write_api=write_api,
+        args=args,
+        model=model,
+        feature_cols=feature_cols,
+        threshold=threshold,
+        wide_df=_parse_times(wide_df),
+        event_time=stop_ts,
+        tag_cols=tag_cols,
+        site_risk_history=site_risk_history,
+        watermarks=watermarks,
+    )
+
 
+def _run_chunked(
+    chunks: Iterable[pd.DataFrame],
+    write_api,
+    args: argparse.Namespace,
+    model,
+    feature_cols: List[str],
+    threshold: float,
+    start_ts: datetime,
+    stop_ts: datetime,
+    tag_cols: List[str],
+    site_risk_history: Dict[str, List[float]],
+    watermarks: Watermarks,
+) -> int:
+    """Score and write each chunk before the next is fetched; one site summary covers the whole window."""
+    # Floors are fixed when the window starts; a node split across several tables would otherwise
+    # drop its later tables as too late against its own earlier chunks.
+    start_floors = watermarks.floors()
+    stats: Optional[Dict[str, object]] = None
+    rows = 0
+    for n, chunk in enumerate(chunks, start=1):
+        rows += len(chunk)
+        fresh_df = _drop_processed(_parse_times(chunk), watermarks, floors=start_floors)
+        if fresh_df.empty:
+            continue
+        scored_df = _score_and_write_nodes(
+            write_api, args, model, feature_cols, threshold, fresh_df, tag_cols, watermarks
+        )
+        if not scored_df.empty:
+            stats = _merge_site_stats(stats, _site_stats(scored_df))
+        logging.debug("Chunk %d: %d rows, %d scored", n, len(chunk), len(scored_df))
+
+    if not rows:
+        logging.info("No telemetry rows returned for window %s -> %s", _iso_utc(start_ts), _iso_utc(stop_ts))
+        return 0
+    if stats is None:
+        logging.info("No new rows with a complete numeric feature set among %d rows in window", rows)
+        return 0
+
+    site_count = _write_site_summary(write_api, args, stats, stop_ts, site_risk_history)
+    _log_written(args, stats["rows"], site_count)
+    return stats["rows"]
+
+
+def _score_and_write_nodes(
+    write_api,
+    args: argparse.Namespace,
+    model,
+    feature_cols: List[str],
+    threshold: float,
+    fresh_df: pd.DataFrame,
+    tag_cols: List[str],
+    watermarks: Watermarks,
+) -> pd.DataFrame:
+    """Score unprocessed rows, write their node decisions and advance the watermarks."""
     scored_df = _score_batch(
-        frame=wide_df,
+        frame=fresh_df,
         model=model,
         feature_cols=feature_cols,
         threshold=threshold,
         high_thr=args.high,
         critical_thr=args.critical,
     )
-    if scored_df.empty:
-        logging.info("Rows received, but none had complete numeric feature set for inference")
-        return 0
+    if not scored_df.empty and not args.dry_run:
+        _write_node_points(
+            write_api=write_api,
+            org=args.influx_org,
+            bucket=args.output_bucket,
+            measurement=args.node_measurement,
+            rows=scored_df,
+            tag_cols=tag_cols,
+        )
+    # Incomplete rows will never become scorable, so they advance the watermark too.
+    _advance_watermarks(watermarks, fresh_df)
+    return scored_df
 
+
+def _write_site_summary(
+    write_api,
+    args: argparse.Namespace,
+    stats: Dict[str, object],
+    event_time: datetime,
+    site_risk_history: Dict[str, List[float]],
+) -> int:
     site_df = _compute_site_summary_l2(
-        scored_df=scored_df,
+        stats=stats,
         site_risk_history=site_risk_history,
         alpha=args.alpha,
         trend_window_size=args.trend_window_size,
         site_id=args.site_id,
     )
-    event_time = stop_ts
-
     if args.dry_run:
-        logging.info(
-            "DRY-RUN: scored %d node rows, generated %d site rows (no writes)",
-            len(scored_df),
-            len(site_df),
-        )
-        return len(scored_df)
-
-    node_written = _write_node_points(
-        write_api=write_api,
-        org=args.influx_org,
-        bucket=args.output_bucket,
-        measurement=args.node_measurement,
-        rows=scored_df,
-        tag_cols=tag_cols,
-    )
-    site_written = _write_site_points(
+        return len(site_df)
+    return _write_site_points(
         write_api=write_api,
         org=args.influx_org,
         bucket=args.output_bucket,
@@ -483,13 +1109,344 @@ def run_once(
         event_time=event_time,
     )
 
+
+def _log_written(args: argparse.Namespace, node_count: int, site_count: int) -> None:
+    if args.dry_run:
+        logging.info("DRY-RUN: scored %d node rows, generated %d site rows (no writes)", node_count, site_count)
+    else:
+        logging.info(
+            "Wrote %d node decisions and %d site summary points to bucket '%s'",
+            node_count,
+            site_count,
+            args.output_bucket,
+        )
+
+
+def _process_wide_frame(
+    write_api,
+    args: argparse.Namespace,
+    model,
+    feature_cols: List[str],
+    threshold: float,
+    wide_df: pd.DataFrame,
+    event_time: datetime,
+    tag_cols: List[str],
+    site_risk_history: Dict[str, List[float]],
+    watermarks: Watermarks,
+) -> int:
+    fresh_df = _drop_processed(wide_df, watermarks)
+    if fresh_df.empty:
+        logging.info("All %d rows in window were already processed", len(wide_df))
+        return 0
+
+    scored_df = _score_and_write_nodes(
+        write_api, args, model, feature_cols, threshold, fresh_df, tag_cols, watermarks
+    )
+    if scored_df.empty:
+        logging.info("Rows received, but none had complete numeric feature set for inference")
+        return 0
+
+    site_count = _write_site_summary(write_api, args, _site_stats(scored_df), event_time, site_risk_history)
+    _log_written(args, len(scored_df), site_count)
+    return len(scored_df)
+
+
+def _backfill_slices(start: datetime, end: datetime, width: timedelta) -> List[Tuple[datetime, datetime]]:
+    slices = []
+    while start < end:
+        stop = min(start + width, end)
+        slices.append((start, stop))
+        start = stop
+    return slices
+
+
+def _score_slice(
+    query_api,
+    args: argparse.Namespace,
+    model,
+    feature_cols: List[str],
+    threshold: float,
+    start_ts: datetime,
+    stop_ts: datetime,
+) -> Tuple[int, pd.DataFrame, pd.DataFrame]:
+    """Query and score one backfill slice. Returns (rows read, rows kept, scored rows); nothing is written."""
+    query_fields = list(dict.fromkeys(feature_cols + IMAGE_COLS + ["PR_DEV", "PR_SLOPE"]))
+    flux = _build_flux_query_with_filters(
+        args.input_bucket,
+        args.input_measurement,
+        start_ts,
+        stop_ts,
+        node_id_filter=args.node_id_filter,
+        field_filters=query_fields,
+    )
+    # The slice is loaded in one frame: --backfill-slice-minutes, not --query-chunk-rows, bounds memory here,
+    # since the result has to be held until every earlier slice has been written.
+    wide_df = _to_wide(_concat_query_frames(query_api.query_data_frame(flux)))
+    if wide_df.empty:
+        return 0, pd.DataFrame(), pd.DataFrame()
+
+    # Backfill re-scores the range regardless of the checkpoint; only repeats are dropped.
+    fresh_df = _drop_processed(_parse_times(wide_df), Watermarks())
+    scored_df = _score_batch(
+        frame=fresh_df,
+        model=model,
+        feature_cols=feature_cols,
+        threshold=threshold,
+        high_thr=args.high,
+        critical_thr=args.critical,
+    )
+    kept_df = fresh_df[[c for c in ("_time", RAW_NODE_ID_COL) if c in fresh_df.columns]]
+    return len(wide_df), kept_df, scored_df
+
+
+def run_backfill(
+    query_api,
+    write_api,
+    args: argparse.Namespace,
+    model,
+    feature_cols: List[str],
+    threshold: float,
+    tag_cols: List[str],
+    site_risk_history: Dict[str, List[float]],
+    watermarks: Watermarks,
+) -> int:
+    """
+    Re-score args.backfill = (start, end) slice by slice.
+
+    Up to --backfill-workers slices are queried and scored concurrently,
+    but results are written by this thread in slice order, so every node's
+    points are written in time order and site_risk_history advances one
+    slice at a time exactly as live polling would.
+    """
+    start, end = args.backfill
+    slices = _backfill_slices(start, end, timedelta(minutes=args.backfill_slice_minutes))
+    workers = max(1, args.backfill_workers)
     logging.info(
-        "Wrote %d node decisions and %d site summary points to bucket '%s'",
-        node_written,
-        site_written,
-        args.output_bucket,
+        "Backfill %s -> %s: %d slices of %.1f min, %d workers",
+        _iso_utc(start),
+        _iso_utc(end),
+        len(slices),
+        args.backfill_slice_minutes,
+        workers,
     )
-    return node_written
+
+    started = time.monotonic()
+    total_rows = total_scored = total_sites = 0
+    pending = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as pool:
+        submitted = iter(slices)
+        # Keep at most 2x workers slices in memory: running plus finished but not yet written.
+        for slice_start, slice_stop in islice(submitted, 2 * workers):
+            pending.append(
+                (slice_stop, pool.submit(_score_slice, query_api, args, model, feature_cols, threshold, slice_start, slice_stop))
+            )
+
+        done = 0
+        while pending:
+            slice_stop, future = pending.pop(0)
+            rows, kept_df, scored_df = future.result()
+            for slice_start, next_stop in islice(submitted, 1):
+                pending.append(
+                    (next_stop, pool.submit(_score_slice, query_api, args, model, feature_cols, threshold, slice_start, next_stop))
+                )
+
+            if not scored_df.empty:
+                if not args.dry_run:
+                    _write_node_points(
+                        write_api=write_api,
+                        org=args.influx_org,
+                        bucket=args.output_bucket,
+                        measurement=args.node_measurement,
+                        rows=scored_df,
+                        tag_cols=tag_cols,
+                    )
+                total_sites += _write_site_summary(write_api, args, _site_stats(scored_df), slice_stop, site_risk_history)
+            _advance_watermarks(watermarks, kept_df)
+
+            done += 1
+            total_rows += rows
+            total_scored += len(scored_df)
+            elapsed = time.monotonic() - started
+            eta = elapsed / done * (len(slices) - done)
+            logging.info(
+                "Backfill %d/%d (%.0f%%) through %s: %d rows read, %d scored, %.0f rows/s, ETA %.0fs",
+                done,
+                len(slices),
+                100.0 * done / len(slices),
+                _iso_utc(slice_stop),
+                total_rows,
+                total_scored,
+                total_rows / elapsed if elapsed > 0 else 0.0,
+                eta,
+            )
+
+    _log_written(args, total_scored, total_sites)
+    return total_scored
+
+
+MQTT_META_KEYS = {"measurement", "timestamp"}
+
+
+def _payload_time(value: object) -> pd.Timestamp:
+    """Same rules as to_ns in mqtt_to_influx_curl.sh: epoch s or ns, ISO string, else now."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if value > 1_000_000_000_000:
+            return pd.Timestamp(int(value), unit="ns", tz="UTC")
+        return pd.Timestamp(value, unit="s", tz="UTC")
+    if isinstance(value, str):
+        parsed = pd.to_datetime(value, utc=True, errors="coerce")
+        if pd.notna(parsed):
+            return parsed
+    return pd.Timestamp.now(tz="UTC")
+
+
+def _payloads_to_frame(payloads: List[dict], args: argparse.Namespace, feature_cols: List[str]) -> pd.DataFrame:
+    """Wide frame of the payloads the model can score.
+
+    Payloads without every feature column (e.g. LoRa frames forwarded by the
+    hub, keyed <sensor>_<metric>) are still stored by the MQTT bridge but are
+    skipped here, so they neither fail the micro-batch nor move watermarks.
+    """
+    rows = []
+    for payload in payloads:
+        measurement = str(payload.get("measurement") or "")
+        if args.input_measurement and measurement and measurement != args.input_measurement:
+            continue
+        if any(payload.get(col) is None for col in feature_cols):
+            continue
+        # node_id is escaped like the Influx tag written by the MQTT bridge so watermarks line up.
+        node_id = str(payload.get(RAW_NODE_ID_COL) or "unknown")
+        for ch in " ,=":
+            node_id = node_id.replace(ch, "_")
+        if args.node_id_filter and node_id != args.node_id_filter:
+            continue
+
+        row = {k: v for k, v in payload.items() if k not in MQTT_META_KEYS and v is not None}
+        row[RAW_NODE_ID_COL] = node_id
+        row["_time"] = _payload_time(payload.get("timestamp"))
+        rows.append(row)
+
+    if not rows:
+        return pd.DataFrame()
+    frame = pd.DataFrame.from_records(rows)
+    frame["_time"] = pd.to_datetime(frame["_time"], utc=True)
+    return frame
+
+
+def _drain_batch(inbox: "queue.Queue[dict]", max_rows: int, max_wait: float) -> List[dict]:
+    """Block up to 1 s for a first payload, then collect until max_rows or max_wait elapses."""
+    try:
+        batch = [inbox.get(timeout=1.0)]
+    except queue.Empty:
+        return []
+
+    deadline = time.monotonic() + max_wait
+    while len(batch) < max_rows:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(inbox.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def run_mqtt(
+    write_api,
+    args: argparse.Namespace,
+    model,
+    feature_cols: List[str],
+    threshold: float,
+    tag_cols: List[str],
+    site_risk_history: Dict[str, List[float]],
+    watermarks: Watermarks,
+    checkpoint: Checkpointer,
+) -> None:
+    """Score telemetry pushed to --mqtt-topic in micro-batches instead of polling Influx."""
+    import paho.mqtt.client as mqtt
+
+    # Compact/MessagePack/CBOR decoding is shared with the MQTT bridge (pip install common/)
+    from telemetry_schema import decode_message
+
+    inbox: "queue.Queue[dict]" = queue.Queue(maxsize=max(1, args.mqtt_queue_size))
+    dropped = 0
+
+    def on_connect(client, userdata, *_):
+        client.subscribe(args.mqtt_topic, qos=args.mqtt_qos)
+        logging.info("Subscribed to MQTT %s:%d topic=%s", args.mqtt_host, args.mqtt_port, args.mqtt_topic)
+
+    def on_message(client, userdata, msg):
+        nonlocal dropped
+        try:
+            payload = decode_message(msg.topic, msg.payload)
+        except (ValueError, UnicodeDecodeError, RuntimeError):
+            logging.warning("Skipping invalid payload on %s", msg.topic)
+            return
+        # Runs on paho's network thread: never block it, or keepalives and acks stall too.
+        try:
+            inbox.put_nowait(payload)
+        except queue.Full:
+            dropped += 1
+
+    if hasattr(mqtt, "CallbackAPIVersion"):
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=args.mqtt_client_id)
+    else:
+        client = mqtt.Client(client_id=args.mqtt_client_id, clean_session=True)
+    if args.mqtt_username:
+        client.username_pw_set(args.mqtt_username, args.mqtt_password)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(args.mqtt_host, args.mqtt_port, keepalive=60)
+    client.loop_start()
+
+    max_wait = max(0.0, args.mqtt_batch_wait_ms / 1000.0)
+    last_checkpoint = time.monotonic()
+    reported_drops = 0
+    try:
+        while True:
+            batch = _drain_batch(inbox, max(1, args.mqtt_batch_size), max_wait)
+            if batch:
+                try:
+                    frame = _payloads_to_frame(batch, args, feature_cols)
+                    processed = 0
+                    if not frame.empty:
+                        processed = _process_wide_frame(
+                            write_api=write_api,
+                            args=args,
+                            model=model,
+                            feature_cols=feature_cols,
+                            threshold=threshold,
+                            wide_df=frame,
+                            event_time=datetime.now(timezone.utc),
+                            tag_cols=tag_cols,
+                            site_risk_history=site_risk_history,
+                            watermarks=watermarks,
+                        )
+                    logging.debug("Micro-batch complete; payloads: %d scored rows: %d", len(batch), processed)
+                except Exception:
+                    logging.exception("Micro-batch failed")
+
+            if dropped > reported_drops:
+                logging.warning(
+                    "MQTT inbox full (%d); dropped %d payloads (%d total)",
+                    inbox.maxsize,
+                    dropped - reported_drops,
+                    dropped,
+                )
+                reported_drops = dropped
+
+            if time.monotonic() - last_checkpoint >= args.poll_interval:
+                checkpoint.mark()
+                last_checkpoint = time.monotonic()
+
+            if args.once and batch:
+                break
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        checkpoint.mark()
+        checkpoint.close()
 
 
 def main() -> None:
@@ -508,13 +1465,42 @@ def main() -> None:
         raise ValueError("model config missing 'feature_cols'")
 
     threshold = float(model_cfg.get("recommended_threshold", 0.5))
-    model = joblib.load(args.model)
+    model = None
+    if args.kernel and args.kernel.exists():
+        kernel = load_kernel(args.kernel)
+        if kernel.feature_cols != feature_cols:
+            raise ValueError(f"{args.kernel} was exported for {kernel.feature_cols}, config expects {feature_cols}")
+        # The kernel only stands in for --model if it was exported from that exact file.
+        if not args.model.exists() or kernel.source_sha256 == model_digest(args.model):
+            model = kernel
+            logging.info("Model: NumPy kernel %s", args.kernel)
+        else:
+            logging.warning(
+                "KERNEL IGNORED: %s was not exported from %s (sha256 mismatch); scoring with the sklearn "
+                "pipeline instead. Re-run scripts/export_logreg_kernel.py to use the kernel.",
+                args.kernel,
+                args.model,
+            )
+    if model is None:
+        import joblib
+
+        model = joblib.load(args.model)
+        logging.info("Model: sklearn pipeline %s", args.model)
 
     tag_cols = _safe_tag_cols(args.tag_columns)
 
     logging.info("Fog pipeline starting")
     logging.info("Influx URL: %s", args.influx_url)
-    if args.input_measurement:
+    if args.source == "mqtt":
+        logging.info(
+            "Input: mqtt=%s:%d topic=%s batch=%d/%dms",
+            args.mqtt_host,
+            args.mqtt_port,
+            args.mqtt_topic,
+            args.mqtt_batch_size,
+            args.mqtt_batch_wait_ms,
+        )
+    elif args.input_measurement:
         logging.info("Input: bucket=%s measurement=%s", args.input_bucket, args.input_measurement)
     else:
         logging.info("Input: bucket=%s measurement=<none>", args.input_bucket)
@@ -522,36 +1508,83 @@ def main() -> None:
     logging.info("Fog site ID: %s", args.site_id)
     logging.info("L2 params: alpha=%.3f trend_window_size=%d", args.alpha, args.trend_window_size)
 
-    last_processed = datetime.now(timezone.utc) - timedelta(minutes=args.bootstrap_lookback_minutes)
+    allowed_lateness = timedelta(seconds=max(0.0, args.allowed_lateness_seconds))
+    watermarks = _load_checkpoint(args.checkpoint_file, allowed_lateness)
+    bootstrap_lookback = timedelta(minutes=args.bootstrap_lookback_minutes)
+    max_node_lag = timedelta(minutes=max(0.0, args.max_node_lag_minutes))
+    if watermarks:
+        logging.info(
+            "Resuming from checkpoint %s: %d nodes, newest %s",
+            args.checkpoint_file,
+            len(watermarks),
+            _iso_utc(watermarks.newest().to_pydatetime()),
+        )
     site_risk_history: Dict[str, List[float]] = {}
 
     with InfluxDBClient(url=args.influx_url, token=args.influx_token, org=args.influx_org) as client:
-        query_api = client.query_api()
-        write_api = client.write_api(write_options=SYNCHRONOUS)
-
-        while True:
-            now_ts = datetime.now(timezone.utc)
-            try:
-                processed = run_once(
-                    query_api=query_api,
+        with _open_write_api(client, args) as write_api:
+            checkpoint = Checkpointer(args.checkpoint_file, write_api, watermarks, dry_run=args.dry_run)
+            if args.source == "mqtt":
+                run_mqtt(
                     write_api=write_api,
                     args=args,
                     model=model,
                     feature_cols=feature_cols,
                     threshold=threshold,
-                    start_ts=last_processed,
-                    stop_ts=now_ts,
                     tag_cols=tag_cols,
                     site_risk_history=site_risk_history,
+                    watermarks=watermarks,
+                    checkpoint=checkpoint,
                 )
-                logging.info("Polling window complete; scored rows: %d", processed)
-                last_processed = now_ts
-            except Exception:
-                logging.exception("Pipeline iteration failed")
+                return
+
+            query_api = client.query_api()
+            if args.backfill:
+                try:
+                    run_backfill(
+                        query_api=query_api,
+                        write_api=write_api,
+                        args=args,
+                        model=model,
+                        feature_cols=feature_cols,
+                        threshold=threshold,
+                        tag_cols=tag_cols,
+                        site_risk_history=site_risk_history,
+                        watermarks=watermarks,
+                    )
+                finally:
+                    checkpoint.mark()
+                    checkpoint.close()
+                return
 
-            if args.once:
-                break
-            time.sleep(max(0.1, args.poll_interval))
+            try:
+                while True:
+                    now_ts = datetime.now(timezone.utc)
+                    start_ts = _query_start(watermarks, allowed_lateness, bootstrap_lookback, now_ts, max_node_lag)
+                    try:
+                        processed = run_once(
+                            query_api=query_api,
+                            write_api=write_api,
+                            args=args,
+                            model=model,
+                            feature_cols=feature_cols,
+                            threshold=threshold,
+                            start_ts=start_ts,
+                            stop_ts=now_ts,
+                            tag_cols=tag_cols,
+                            site_risk_history=site_risk_history,
+                            watermarks=watermarks,
+                        )
+                        logging.info("Polling window complete; scored rows: %d", processed)
+                        checkpoint.mark()
+                    except Exception:
+                        logging.exception("Pipeline iteration failed")
+
+                    if args.once:
+                        break
+                    time.sleep(max(0.1, args.poll_interval))
+            finally:
+                checkpoint.close()
 
 
 if __name__ == "__main__":
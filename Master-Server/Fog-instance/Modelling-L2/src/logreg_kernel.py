@@ -0,0 +1,140 @@
+"""
+Pure-NumPy inference for the fog logistic-regression risk model.
+
+The fitted scikit-learn pipeline (StandardScaler -> LogisticRegression) is
+exported once to a small JSON file next to model_config.json. Scoring is
+then one matmul plus a sigmoid, with no scikit-learn import. The scaler is
+folded into the weights at load time:
+
+    risk = sigmoid(X @ (coef / scale) + (intercept - (mean / scale) @ coef))
+
+The export records the sha256 of the .joblib file it came from, so the
+runtime can tell when the kernel is stale.
+
+Export and verification against scikit-learn: scripts/export_logreg_kernel.py
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+KERNEL_FORMAT = "logreg-kernel/1"
+
+
+class LogRegKernel:
+    """Binary logistic regression over standardized features."""
+
+    def __init__(
+        self,
+        feature_cols: List[str],
+        mean: np.ndarray,
+        scale: np.ndarray,
+        coef: np.ndarray,
+        intercept: float,
+        source_sha256: Optional[str] = None,
+    ) -> None:
+        mean = np.asarray(mean, dtype=np.float64)
+        scale = np.asarray(scale, dtype=np.float64)
+        coef = np.asarray(coef, dtype=np.float64)
+        n = len(feature_cols)
+        if mean.shape != (n,) or scale.shape != (n,) or coef.shape != (n,):
+            raise ValueError(f"kernel parameters do not match {n} feature columns")
+
+        self.feature_cols = list(feature_cols)
+        self.mean = mean
+        self.scale = scale
+        self.coef = coef
+        self.intercept = float(intercept)
+        self.source_sha256 = source_sha256
+        self.weights = coef / scale
+        self.bias = self.intercept - float((mean / scale) @ coef)
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        return np.asarray(X, dtype=np.float64) @ self.weights + self.bias
+
+    def predict_risk(self, X: np.ndarray) -> np.ndarray:
+        """P(fault) per row; sigmoid written as exp(-log(1 + e^-z)) so large |z| cannot overflow."""
+        return np.exp(-np.logaddexp(0.0, -self.decision_function(X)))
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Same shape as sklearn's predict_proba: columns [P(0), P(1)]."""
+        risk = self.predict_risk(X)
+        return np.column_stack([1.0 - risk, risk])
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "format": KERNEL_FORMAT,
+            "feature_cols": self.feature_cols,
+            "scaler_mean": self.mean.tolist(),
+            "scaler_scale": self.scale.tolist(),
+            "coef": self.coef.tolist(),
+            "intercept": self.intercept,
+            "source_sha256": self.source_sha256,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> "LogRegKernel":
+        if data.get("format") != KERNEL_FORMAT:
+            raise ValueError(f"unsupported kernel format {data.get('format')!r}")
+        return cls(
+            feature_cols=list(data["feature_cols"]),
+            mean=np.asarray(data["scaler_mean"]),
+            scale=np.asarray(data["scaler_scale"]),
+            coef=np.asarray(data["coef"]),
+            intercept=float(data["intercept"]),
+            source_sha256=data.get("source_sha256"),
+        )
+
+    @classmethod
+    def from_pipeline(cls, pipeline, feature_cols: List[str]) -> "LogRegKernel":
+        """Extract a fitted [StandardScaler ->] LogisticRegression pipeline (or bare estimator)."""
+        steps = [step for _, step in getattr(pipeline, "steps", [(None, pipeline)])]
+        model = steps[-1]
+        n = len(feature_cols)
+        mean = np.zeros(n)
+        scale = np.ones(n)
+        for step in steps[:-1]:
+            if type(step).__name__ != "StandardScaler":
+                raise ValueError(f"cannot export pipeline step {type(step).__name__}")
+            mean, scale = _compose_scaler(mean, scale, step)
+
+        if type(model).__name__ != "LogisticRegression":
+            raise ValueError(f"cannot export estimator {type(model).__name__}")
+        coef = np.asarray(model.coef_, dtype=np.float64)
+        if coef.shape != (1, n) or len(model.classes_) != 2:
+            raise ValueError("only binary logistic regression over the configured features can be exported")
+        return cls(feature_cols, mean, scale, coef[0], float(np.asarray(model.intercept_)[0]))
+
+
+def _compose_scaler(mean: np.ndarray, scale: np.ndarray, scaler) -> Tuple[np.ndarray, np.ndarray]:
+    """Fold one more StandardScaler after (x - mean) / scale into a single (mean, scale)."""
+    step_mean = scaler.mean_ if getattr(scaler, "mean_", None) is not None and scaler.with_mean else 0.0
+    step_scale = scaler.scale_ if getattr(scaler, "scale_", None) is not None and scaler.with_std else 1.0
+    # ((x - m) / s - m2) / s2 == (x - (m + m2 * s)) / (s * s2)
+    return mean + step_mean * scale, scale * step_scale
+
+
+def model_digest(path: Path) -> str:
+    """sha256 of a model file, as recorded in source_sha256 at export."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_kernel(kernel: LogRegKernel, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(kernel.to_dict(), f, indent=2)
+        f.write("\n")
+
+
+def load_kernel(path: Path) -> LogRegKernel:
+    with path.open("r", encoding="utf-8") as f:
+        return LogRegKernel.from_dict(json.load(f))
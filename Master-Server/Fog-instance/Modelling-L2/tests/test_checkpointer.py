@@ -0,0 +1,106 @@
+"""The checkpoint never moves past decision points Influx has not acked."""
+
+from __future__ import annotations
+
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from fog_influx_logreg_pipeline import (  # noqa: E402
+    Checkpointer,
+    Watermarks,
+    _advance_watermarks,
+    _load_checkpoint,
+)
+
+T0 = pd.Timestamp("2026-10-18T10:00:00Z")
+
+
+class FakeWriteApi:
+    def __init__(self):
+        self.submitted = self.acked = self.failed = 0
+
+    def write(self, points):
+        self.submitted += points
+
+    def counts(self):
+        return self.submitted, self.acked, self.failed
+
+    def close(self):
+        pass
+
+
+def _advance(watermarks, seconds):
+    _advance_watermarks(watermarks, pd.DataFrame({"node_id": ["a"], "_time": [T0 + pd.Timedelta(seconds=seconds)]}))
+
+
+def _saved_mark(path):
+    return _load_checkpoint(path, timedelta(0)).marks.get("a")
+
+
+def test_checkpoint_waits_for_ack(tmp_path):
+    path = tmp_path / "cp.json"
+    write_api = FakeWriteApi()
+    watermarks = Watermarks()
+    checkpoint = Checkpointer(path, write_api, watermarks)
+
+    write_api.write(10)
+    _advance(watermarks, 10)
+    checkpoint.mark()
+    assert not path.exists()
+
+    write_api.write(5)
+    _advance(watermarks, 20)
+    checkpoint.mark()
+    write_api.acked = 10
+    checkpoint.commit()
+    assert _saved_mark(path) == T0 + pd.Timedelta(seconds=10)
+
+    write_api.acked = 15
+    checkpoint.commit()
+    assert _saved_mark(path) == T0 + pd.Timedelta(seconds=20)
+
+
+def test_failed_batch_rolls_watermarks_back(tmp_path):
+    path = tmp_path / "cp.json"
+    write_api = FakeWriteApi()
+    watermarks = Watermarks()
+    checkpoint = Checkpointer(path, write_api, watermarks)
+
+    write_api.write(10)
+    _advance(watermarks, 10)
+    checkpoint.mark()
+    write_api.acked = 10
+    checkpoint.commit()
+
+    write_api.write(10)
+    _advance(watermarks, 20)
+    checkpoint.mark()
+    write_api.failed = 4
+    write_api.acked = 16
+    checkpoint.commit()
+
+    assert _saved_mark(path) == T0 + pd.Timedelta(seconds=10)
+    assert watermarks.marks["a"] == T0 + pd.Timedelta(seconds=10)
+
+    # Later writes that succeed move the checkpoint forward again.
+    write_api.write(10)
+    _advance(watermarks, 30)
+    checkpoint.mark()
+    write_api.acked = 26
+    checkpoint.commit()
+    assert _saved_mark(path) == T0 + pd.Timedelta(seconds=30)
+
+
+def test_dry_run_never_writes(tmp_path):
+    path = tmp_path / "cp.json"
+    watermarks = Watermarks()
+    checkpoint = Checkpointer(path, FakeWriteApi(), watermarks, dry_run=True)
+    _advance(watermarks, 10)
+    checkpoint.mark()
+    checkpoint.close()
+    assert not path.exists()
@@ -0,0 +1,51 @@
+"""The NumPy kernel scores exactly like the scikit-learn pipeline it was exported from."""
+
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from logreg_kernel import LogRegKernel, load_kernel, model_digest  # noqa: E402
+
+MODELS = Path(__file__).resolve().parents[1] / "models"
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    pytest.importorskip("sklearn")
+    joblib = pytest.importorskip("joblib")
+    return joblib.load(MODELS / "logreg_risk_model.joblib")
+
+
+@pytest.fixture(scope="module")
+def feature_cols():
+    with (MODELS / "model_config.json").open("r", encoding="utf-8") as f:
+        return json.load(f)["feature_cols"]
+
+
+def _rows(kernel: LogRegKernel, n: int = 5000) -> np.ndarray:
+    rng = np.random.default_rng(7)
+    return kernel.mean + kernel.scale * rng.uniform(-6.0, 6.0, size=(n, len(kernel.feature_cols)))
+
+
+def test_committed_kernel_matches_pipeline(pipeline, feature_cols):
+    kernel = load_kernel(MODELS / "logreg_kernel.json")
+    assert kernel.feature_cols == feature_cols
+    assert kernel.source_sha256 == model_digest(MODELS / "logreg_risk_model.joblib")
+
+    X = _rows(kernel)
+    np.testing.assert_allclose(kernel.predict_proba(X), pipeline.predict_proba(X), rtol=0, atol=1e-9)
+
+
+def test_from_pipeline_round_trips(pipeline, feature_cols):
+    kernel = LogRegKernel.from_pipeline(pipeline, feature_cols)
+    X = _rows(kernel)
+    restored = LogRegKernel.from_dict(json.loads(json.dumps(kernel.to_dict())))
+    np.testing.assert_array_equal(restored.predict_risk(X), kernel.predict_risk(X))
+    np.testing.assert_allclose(kernel.predict_risk(X), pipeline.predict_proba(X)[:, 1], rtol=0, atol=1e-9)
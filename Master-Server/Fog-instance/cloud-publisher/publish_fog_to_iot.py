@@ -8,13 +8,20 @@ import json
 import os
 import ssl
 import time
-from collections import defaultdict
+from collections import deque
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Iterable, List
+from typing import Deque, Dict, Iterable, List, Tuple
 
 import paho.mqtt.client as mqtt
 from influxdb_client import InfluxDBClient
 
+try:  # optional, several times faster than the stdlib encoder
+    import orjson
+except ImportError:
+    orjson = None
+
+from telemetry_schema import PAYLOAD_FORMATS, encode_payload, publish_topic
+
 
 META_COLS = {"result", "table", "_start", "_stop"}
 
@@ -37,6 +44,22 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--qos", type=int, default=1, choices=[0, 1, 2])
     parser.add_argument("--metrics-topic", default=os.getenv("FOG_METRICS_TOPIC", "solar/rtu"))
     parser.add_argument("--l2-topic-prefix", default=os.getenv("FOG_L2_TOPIC_PREFIX", "solar/l2"))
+    parser.add_argument(
+        "--metrics-fields",
+        default=os.getenv("FOG_METRICS_FIELDS", ""),
+        help="Comma-separated fields to publish on the metrics topic (default: all)",
+    )
+    parser.add_argument(
+        "--l2-fields",
+        default=os.getenv("FOG_L2_FIELDS", ""),
+        help="Comma-separated fields to publish on the L2 topics (default: all)",
+    )
+    parser.add_argument(
+        "--payload-format",
+        default=os.getenv("FOG_PAYLOAD_FORMAT", "json"),
+        choices=PAYLOAD_FORMATS,
+        help="json keeps the nested legacy payload; compact/msgpack/cbor use the flat short-key schema on <topic>/<c1|m1|b1>",
+    )
 
     parser.add_argument("--mqtt-username", default=os.getenv("MQTT_USERNAME", ""))
     parser.add_argument("--mqtt-password", default=os.getenv("MQTT_PASSWORD", ""))
@@ -49,11 +72,21 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between polls")
     parser.add_argument("--lookback-seconds", type=float, default=15.0, help="Initial lookback window")
     parser.add_argument("--dry-run", action="store_true", help="Print outgoing payloads without publishing")
+    parser.add_argument("--verbose", action="store_true", help="Print every published payload")
+    parser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=int(os.getenv("FOG_MQTT_MAX_INFLIGHT", "100")),
+        help="Unacknowledged QoS>0 publishes allowed at once (1 = stop-and-wait)",
+    )
 
     args = parser.parse_args()
     if not args.influx_token or not args.influx_org:
         raise ValueError("Missing Influx credentials: set INFLUXDB_TOKEN and INFLUXDB_ORG")
 
+    args.metrics_fields = [f.strip() for f in args.metrics_fields.split(",") if f.strip()]
+    args.l2_fields = [f.strip() for f in args.l2_fields.split(",") if f.strip()]
+
     if args.mqtt_port is None:
         env_port = os.getenv("MQTT_PORT")
         if env_port:
@@ -70,81 +103,114 @@ def _iso_utc(dt: datetime) -> str:
     return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
-def _concat_frames(raw: object):
-    import pandas as pd
+def _rfc3339(raw: str) -> str:
+    """Influx RFC3339Nano -> the microsecond ISO form _iso_utc() produces."""
+    head, dot, frac = raw.rstrip("Z").partition(".")
+    frac = frac[:6].ljust(6, "0") if dot else ""
+    return f"{head}.{frac}Z" if frac.strip("0") else f"{head}Z"
 
-    if isinstance(raw, list):
-        frames = [f for f in raw if isinstance(f, pd.DataFrame) and not f.empty]
-        if not frames:
-            return pd.DataFrame()
-        return pd.concat(frames, ignore_index=True)
-    if isinstance(raw, pd.DataFrame):
-        return raw.copy()
-    return pd.DataFrame()
 
+def _build_flux_query(bucket: str, start_ts: datetime, stop_ts: datetime, fields: List[str]) -> str:
+    """Pivoted rows, one table per series key (measurement + tags, so per node_id), optionally projected."""
+    bucket = bucket.replace('"', '\\"')
+    fields = [str(field).replace('"', '\\"') for field in fields if str(field).strip()]
 
-def _query_long_rows(query_api, bucket: str, start_ts: datetime, stop_ts: datetime):
-    flux = f'''
+    field_filter_expr = ""
+    if fields:
+        checks = [f'r["_field"] == "{field}"' for field in fields]
+        field_filter_expr = f"\n  |> filter(fn: (r) => {' or '.join(checks)})"
+
+    return f'''
 from(bucket: "{bucket}")
-  |> range(start: time(v: "{_iso_utc(start_ts)}"), stop: time(v: "{_iso_utc(stop_ts)}"))
+  |> range(start: time(v: "{_iso_utc(start_ts)}"), stop: time(v: "{_iso_utc(stop_ts)}")){field_filter_expr}
+  |> drop(columns: ["_start", "_stop"])
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
 '''.strip()
-    raw = query_api.query_data_frame(flux)
-    return _concat_frames(raw)
 
 
-def _extract_tags(row: Dict[str, object]) -> Dict[str, str]:
-    tags: Dict[str, str] = {}
-    for key, value in row.items():
-        if key in META_COLS or key.startswith("_"):
+def _parse_cell(kind: str, raw: str) -> object:
+    if kind == "double":
+        return float(raw)
+    if kind in ("long", "unsignedLong"):
+        return int(raw)
+    if kind == "boolean":
+        return raw == "true"
+    return raw
+
+
+def _iter_payloads(rows: Iterable[List[str]], default_measurement: str) -> Iterable[Dict[str, object]]:
+    """
+    One payload per pivoted row of an annotated Flux CSV stream.
+
+    Group-key columns are tags; the other non-underscore columns are fields.
+    Column roles are resolved once per table, not per row.
+    """
+    fallback = default_measurement or "solar_rtu"
+    datatypes: List[str] = []
+    group: List[str] = []
+    header: List[str] = []
+    time_idx = measurement_idx = None
+    tag_cols: List[Tuple[int, str]] = []
+    field_cols: List[Tuple[int, str, str]] = []
+
+    for row in rows:
+        if not row:
+            continue
+        if row[0] == "#datatype":
+            datatypes, header = row, []
+            continue
+        if row[0] == "#group":
+            group = row
             continue
-        if value is None:
+        if row[0].startswith("#"):
             continue
-        # Treat non-numeric columns as tags.
-        if isinstance(value, str):
-            tags[key] = value
-    return tags
+        if not header:
+            header = row
+            time_idx = header.index("_time") if "_time" in header else None
+            measurement_idx = header.index("_measurement") if "_measurement" in header else None
+            tag_cols = [
+                (i, name) for i, name in enumerate(header)
+                if name and name not in META_COLS and not name.startswith("_") and group[i] == "true"
+            ]
+            field_cols = [
+                (i, name, datatypes[i]) for i, name in enumerate(header)
+                if name and name not in META_COLS and not name.startswith("_") and group[i] != "true"
+            ]
+            continue
+        if time_idx is None and "error" in header:
+            raise RuntimeError(f"Flux query failed: {dict(zip(header, row))}")
 
+        fields = {name: _parse_cell(kind, row[i]) for i, name, kind in field_cols if row[i] != ""}
+        if not fields:
+            continue
+        measurement = row[measurement_idx] if measurement_idx is not None else ""
+        if measurement.lower() in {"", "null", "none", "nan"}:
+            measurement = fallback
+        yield {
+            "timestamp": _rfc3339(row[time_idx]) if time_idx is not None and row[time_idx] else _iso_utc(datetime.now(timezone.utc)),
+            "measurement": measurement,
+            "tags": {name: row[i] for i, name in tag_cols if row[i] != ""},
+            "fields": fields,
+        }
 
-def _iter_payloads(df, default_measurement: str) -> Iterable[Dict[str, object]]:
-    if df.empty:
-        return
 
-    grouped: Dict[tuple, Dict[str, object]] = {}
+def _stream_payloads(query_api, bucket: str, start_ts: datetime, stop_ts: datetime, fields: List[str], default_measurement: str):
+    """Stream payloads for [start_ts, stop_ts) without materialising the result."""
+    rows = query_api.query_csv(_build_flux_query(bucket, start_ts, stop_ts, fields))
+    return _iter_payloads(rows, default_measurement)
 
-    for _, series in df.iterrows():
-        row = series.to_dict()
-        if "_field" not in row or "_value" not in row:
-            continue
 
-        ts_raw = row.get("_time")
-        if hasattr(ts_raw, "to_pydatetime"):
-            ts = ts_raw.to_pydatetime().astimezone(timezone.utc)
-        elif isinstance(ts_raw, datetime):
-            ts = ts_raw.astimezone(timezone.utc)
-        else:
-            ts = datetime.now(timezone.utc)
+def _json_default(value: object) -> object:
+    # NumPy scalars that survive the pivot
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
 
-        measurement = str(row.get("_measurement") or default_measurement or "solar_rtu")
-        if measurement.lower() in {"", "null", "none", "nan"}:
-            measurement = default_measurement or "solar_rtu"
-
-        tags = _extract_tags(row)
-        node_id = str(tags.get("node_id", row.get("node_id", "")))
-        group_key = (measurement, _iso_utc(ts), node_id)
-
-        payload = grouped.setdefault(
-            group_key,
-            {
-                "timestamp": _iso_utc(ts),
-                "measurement": measurement,
-                "tags": tags,
-                "fields": {},
-            },
-        )
-        payload["fields"][str(row.get("_field"))] = row.get("_value")
 
-    for payload in grouped.values():
-        yield payload
+def _dumps(obj: object) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_json_default)
+    return json.dumps(obj, separators=(",", ":"), default=_json_default).encode("utf-8")
 
 
 def _mqtt_client(args: argparse.Namespace) -> mqtt.Client:
@@ -177,21 +243,54 @@ def _mqtt_client(args: argparse.Namespace) -> mqtt.Client:
         )
         raise ConnectionError(hint) from exc
 
+    client.max_inflight_messages_set(max(1, args.max_inflight))
     client.loop_start()
     return client
 
 
-def _publish_batch(client: mqtt.Client, topic: str, payloads: Iterable[Dict[str, object]], qos: int, dry_run: bool) -> int:
+def _encode(payload: Dict[str, object], fmt: str) -> bytes:
+    if fmt == "json":
+        return _dumps(payload)
+    # Compact schema is flat: tags and fields sit next to the header keys.
+    flat: Dict[str, object] = {
+        "measurement": payload.get("measurement"),
+        "node_id": payload.get("tags", {}).get("node_id"),
+        "timestamp": payload.get("timestamp"),
+    }
+    for key, value in payload.get("tags", {}).items():
+        flat.setdefault(key, value)
+    for key, value in payload.get("fields", {}).items():
+        flat.setdefault(key, value)
+    return encode_payload(flat, fmt)
+
+
+def _publish_batch(
+    client: mqtt.Client,
+    messages: Iterable[Tuple[str, Dict[str, object]]],
+    qos: int,
+    dry_run: bool,
+    fmt: str = "json",
+    max_inflight: int = 100,
+    verbose: bool = False,
+) -> int:
+    """Publish (topic, payload) pairs with up to max_inflight unacknowledged at a time."""
     count = 0
-    for payload in payloads:
-        body = json.dumps(payload, separators=(",", ":"))
-        if dry_run:
-            print(f"DRY-RUN topic={topic} payload={body}")
-        else:
-            print(f"LIVE topic={topic} payload={body}", flush=True)
-            result = client.publish(topic, payload=body, qos=qos)
-            result.wait_for_publish()
-        count += 1
+    inflight: Deque[mqtt.MQTTMessageInfo] = deque()
+    try:
+        for topic, payload in messages:
+            topic = publish_topic(topic, fmt)
+            body = _encode(payload, fmt)
+            if dry_run or verbose:
+                mode = "DRY-RUN" if dry_run else "LIVE"
+                print(f"{mode} topic={topic} bytes={len(body)} payload={_dumps(payload).decode('utf-8')}", flush=True)
+            if not dry_run:
+                if len(inflight) >= max_inflight:
+                    inflight.popleft().wait_for_publish()
+                inflight.append(client.publish(topic, payload=body, qos=qos))
+            count += 1
+    finally:
+        while inflight:
+            inflight.popleft().wait_for_publish()
     return count
 
 
@@ -199,7 +298,7 @@ def main() -> None:
     args = parse_args()
     print(f"Fog IoT publisher starting | mqtt={args.mqtt_host}:{args.mqtt_port}")
     print(f"Source buckets: metrics={args.metrics_bucket} l2={args.l2_bucket}")
-    print(f"Topics: metrics={args.metrics_topic} l2_prefix={args.l2_topic_prefix}")
+    print(f"Topics: metrics={args.metrics_topic} l2_prefix={args.l2_topic_prefix} format={args.payload_format}")
 
     client = _mqtt_client(args)
     last_metrics = datetime.now(timezone.utc) - timedelta(seconds=args.lookback_seconds)
@@ -211,28 +310,34 @@ def main() -> None:
             while True:
                 now = datetime.now(timezone.utc)
 
-                metrics_df = _query_long_rows(query_api, args.metrics_bucket, last_metrics, now)
+                metrics = _stream_payloads(
+                    query_api, args.metrics_bucket, last_metrics, now, args.metrics_fields, default_measurement="solar_rtu"
+                )
                 metrics_count = _publish_batch(
                     client,
-                    args.metrics_topic,
-                    _iter_payloads(metrics_df, default_measurement="solar_rtu"),
+                    ((args.metrics_topic, p) for p in metrics),
                     qos=args.qos,
                     dry_run=args.dry_run,
+                    fmt=args.payload_format,
+                    max_inflight=args.max_inflight,
+                    verbose=args.verbose,
                 )
                 last_metrics = now
 
-                l2_df = _query_long_rows(query_api, args.l2_bucket, last_l2, now)
-                l2_count = 0
-                for payload in _iter_payloads(l2_df, default_measurement="fog_inference"):
-                    measurement = str(payload.get("measurement") or "unknown")
-                    topic = f"{args.l2_topic_prefix}/{measurement}".replace("//", "/")
-                    l2_count += _publish_batch(
-                        client,
-                        topic,
-                        [payload],
-                        qos=args.qos,
-                        dry_run=args.dry_run,
-                    )
+                l2_count = _publish_batch(
+                    client,
+                    (
+                        (f"{args.l2_topic_prefix}/{p.get('measurement') or 'unknown'}".replace("//", "/"), p)
+                        for p in _stream_payloads(
+                            query_api, args.l2_bucket, last_l2, now, args.l2_fields, default_measurement="fog_inference"
+                        )
+                    ),
+                    qos=args.qos,
+                    dry_run=args.dry_run,
+                    fmt=args.payload_format,
+                    max_inflight=args.max_inflight,
+                    verbose=args.verbose,
+                )
                 last_l2 = now
 
                 if metrics_count or l2_count:
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+MQTT -> InfluxDB ingestion bridge for the fog VM.
+
+Long-running replacement for mqtt_to_influx_curl.sh:
+- Subscribe to RTU telemetry on the local MQTT broker
+- Convert each JSON payload to one line of Influx line protocol
+  (same rules as the jq filter: sane_key, string escaping, to_ns, ingest_ok=1i)
+- Accept compact/MessagePack/CBOR payloads on suffixed topics (see common/telemetry_schema.py)
+- Batch lines by count/latency and POST them to /api/v2/write over one pooled HTTP connection
+- Retry failed writes with exponential backoff and keep ingestion counters
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import os
+import queue
+import re
+import signal
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+import paho.mqtt.client as mqtt
+import urllib3
+
+from telemetry_schema import decode_message
+
+SKIP_KEYS = {"node_id", "timestamp", "measurement"}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_SANE_KEY = re.compile(r"[ ,=]")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="MQTT -> InfluxDB line-protocol bridge")
+
+    parser.add_argument("--mqtt-host", default=os.getenv("MQTT_BROKER", "10.0.40.101"))
+    parser.add_argument("--mqtt-port", type=int, default=int(os.getenv("MQTT_PORT", "1883")))
+    parser.add_argument("--mqtt-topic", default=os.getenv("MQTT_TOPIC", "solar/rtu/#"))
+    parser.add_argument("--mqtt-qos", type=int, default=1, choices=[0, 1, 2])
+    parser.add_argument("--mqtt-client-id", default=os.getenv("MQTT_CLIENT_ID", f"influx-bridge-{uuid.uuid4().hex[:8]}"))
+
+    parser.add_argument("--influx-url", default=os.getenv("INFLUXDB_URL", "http://10.0.40.101:8086"))
+    parser.add_argument("--influx-org", default=os.getenv("INFLUXDB_ORG", "SOLAR-FOG"))
+    parser.add_argument("--influx-bucket", default=os.getenv("INFLUXDB_BUCKET", "metrics"))
+    parser.add_argument("--influx-token", default=os.getenv("INFLUXDB_TOKEN", ""))
+    parser.add_argument(
+        "--measurement",
+        default=os.getenv("MEASUREMENT", "solar_rtu"),
+        help="Measurement used when a payload has no 'measurement' key",
+    )
+
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("BRIDGE_BATCH_SIZE", "1000")))
+    parser.add_argument(
+        "--flush-interval-ms",
+        type=int,
+        default=int(os.getenv("BRIDGE_FLUSH_INTERVAL_MS", "500")),
+        help="Maximum time a line waits in a partial batch",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=int(os.getenv("BRIDGE_QUEUE_SIZE", "100000")),
+        help="Lines buffered between MQTT and the writer before new messages are rejected",
+    )
+    parser.add_argument("--max-retries", type=int, default=int(os.getenv("BRIDGE_MAX_RETRIES", "5")))
+    parser.add_argument("--retry-backoff", type=float, default=0.5, help="Initial retry delay in seconds")
+    parser.add_argument("--retry-backoff-max", type=float, default=30.0, help="Maximum retry delay in seconds")
+    parser.add_argument("--http-timeout", type=float, default=10.0)
+
+    parser.add_argument("--stats-interval", type=float, default=30.0, help="Seconds between counter log lines")
+    parser.add_argument(
+        "--stats-port",
+        type=int,
+        default=int(os.getenv("BRIDGE_STATS_PORT", "0")),
+        help="Serve counters as JSON on http://0.0.0.0:<port>/ (0 disables)",
+    )
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+
+    args = parser.parse_args()
+    if not args.influx_token:
+        raise ValueError("INFLUXDB_TOKEN is required")
+    return args
+
+
+def sane_key(key: str) -> str:
+    return _SANE_KEY.sub("_", key)
+
+
+def esc_str(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _now_ns() -> int:
+    return time.time_ns()
+
+
+def to_ns(value: object) -> int:
+    """Epoch ns from a payload timestamp: ns passthrough, epoch seconds, ISO-8601 string, else now."""
+    if value is None or isinstance(value, bool):
+        return _now_ns()
+    if isinstance(value, (int, float)):
+        if not math.isfinite(value):
+            return _now_ns()
+        if value > 1_000_000_000_000:
+            return int(value)
+        return math.floor(value * 1_000_000_000)
+    if isinstance(value, str):
+        text = value.strip()
+        if text.endswith("Z"):
+            text = text[:-1] + "+00:00"
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            return _now_ns()
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return math.floor(parsed.timestamp() * 1_000_000_000)
+    return _now_ns()
+
+
+def _field(key: str, value: object) -> Optional[str]:
+    if isinstance(value, bool):
+        return f"{sane_key(key)}={'true' if value else 'false'}"
+    if isinstance(value, (int, float)):
+        if isinstance(value, float) and not math.isfinite(value):
+            return None
+        return f"{sane_key(key)}={value}"
+    if isinstance(value, str):
+        return f'{sane_key(key)}="{esc_str(value)}"'
+    return None
+
+
+def payload_to_line(payload: object, default_measurement: str) -> str:
+    """One line of line protocol for an RTU payload, matching the jq filter in mqtt_to_influx_curl.sh."""
+    if not isinstance(payload, dict):
+        raise ValueError("payload is not a JSON object")
+
+    measurement = payload.get("measurement") or default_measurement
+    measurement = str(measurement).replace(",", "\\,").replace(" ", "\\ ")
+    node = sane_key(str(payload.get("node_id") or "unknown"))
+    ts = to_ns(payload.get("timestamp"))
+
+    fields: List[str] = []
+    for key, value in payload.items():
+        if key in SKIP_KEYS or value is None:
+            continue
+        field = _field(str(key), value)
+        if field is not None:
+            fields.append(field)
+    if not fields:
+        fields.append("ingest_ok=1i")
+
+    return f"{measurement},node_id={node} {','.join(fields)} {ts}"
+
+
+class BridgeStats:
+    """Thread-safe ingestion counters."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.messages_in = 0
+        self.rejects = 0
+        self.dropped = 0
+        self.lines_written = 0
+        self.batches_written = 0
+        self.write_failures = 0
+        self.retries = 0
+        self.write_latency_total = 0.0
+        self.write_latency_max = 0.0
+        self.write_latency_last = 0.0
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def record_write(self, lines: int, latency: float) -> None:
+        with self._lock:
+            self.lines_written += lines
+            self.batches_written += 1
+            self.write_latency_total += latency
+            self.write_latency_last = latency
+            self.write_latency_max = max(self.write_latency_max, latency)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            avg = self.write_latency_total / self.batches_written if self.batches_written else 0.0
+            return {
+                "messages_in": self.messages_in,
+                "rejects": self.rejects,
+                "dropped": self.dropped,
+                "lines_written": self.lines_written,
+                "batches_written": self.batches_written,
+                "write_failures": self.write_failures,
+                "retries": self.retries,
+                "write_latency_avg_ms": round(avg * 1000, 2),
+                "write_latency_last_ms": round(self.write_latency_last * 1000, 2),
+                "write_latency_max_ms": round(self.write_latency_max * 1000, 2),
+            }
+
+
+class InfluxLineWriter:
+    """POSTs line-protocol batches to /api/v2/write over a pooled keep-alive connection."""
+
+    def __init__(self, args: argparse.Namespace, stats: BridgeStats) -> None:
+        params = {"org": args.influx_org, "bucket": args.influx_bucket, "precision": "ns"}
+        self.url = f"{args.influx_url.rstrip('/')}/api/v2/write?{urlencode(params)}"
+        self.headers = {
+            "Authorization": f"Token {args.influx_token}",
+            "Content-Type": "text/plain; charset=utf-8",
+        }
+        self.max_retries = max(0, args.max_retries)
+        self.backoff = max(0.0, args.retry_backoff)
+        self.backoff_max = max(self.backoff, args.retry_backoff_max)
+        self.stats = stats
+        self.http = urllib3.PoolManager(
+            maxsize=1,
+            timeout=urllib3.Timeout(total=args.http_timeout),
+            retries=False,
+        )
+
+    def write(self, lines: List[str]) -> bool:
+        body = "\n".join(lines).encode("utf-8")
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                resp = self.http.request("POST", self.url, body=body, headers=self.headers)
+            except urllib3.exceptions.HTTPError as exc:
+                status, reason = None, str(exc)
+            else:
+                status, reason = resp.status, resp.data.decode("utf-8", "replace")
+                if 200 <= status < 300:
+                    self.stats.record_write(len(lines), time.perf_counter() - started)
+                    return True
+                if status not in RETRY_STATUS:
+                    logging.error("Influx rejected batch of %d lines (HTTP %s): %s", len(lines), status, reason)
+                    self.stats.incr("write_failures")
+                    return False
+
+            if attempt == self.max_retries:
+                break
+            self.stats.incr("retries")
+            logging.warning(
+                "Influx write failed (%s); retry %d/%d in %.1fs", status or reason, attempt + 1, self.max_retries, delay
+            )
+            time.sleep(delay)
+            delay = min(self.backoff_max, delay * 2 if delay else self.backoff_max)
+
+        logging.error("Dropping batch of %d lines after %d retries", len(lines), self.max_retries)
+        self.stats.incr("write_failures")
+        return False
+
+    def close(self) -> None:
+        self.http.clear()
+
+
+def _writer_loop(
+    lines_q: "queue.Queue[str]",
+    writer: InfluxLineWriter,
+    batch_size: int,
+    flush_interval: float,
+    stop: threading.Event,
+) -> None:
+    """Collect lines into batches closed by batch_size or flush_interval; drain fully once stop is set."""
+    while not (stop.is_set() and lines_q.empty()):
+        try:
+            batch = [lines_q.get(timeout=0.5)]
+        except queue.Empty:
+            continue
+        deadline = time.monotonic() + flush_interval
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(lines_q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        writer.write(batch)
+
+
+def _serve_stats(port: int, stats: BridgeStats) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            body = json.dumps(stats.snapshot()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="bridge-stats", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    args = parse_args()
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format="%(asctime)s | %(levelname)s | %(message)s",
+    )
+
+    stats = BridgeStats()
+    lines_q: "queue.Queue[str]" = queue.Queue(maxsize=max(1, args.queue_size))
+    stop = threading.Event()
+    writer = InfluxLineWriter(args, stats)
+
+    def on_connect(client, userdata, *_):
+        client.subscribe(args.mqtt_topic, qos=args.mqtt_qos)
+        logging.info("Subscribed MQTT: %s:%d topic=%s", args.mqtt_host, args.mqtt_port, args.mqtt_topic)
+
+    def on_message(client, userdata, msg):
+        stats.incr("messages_in")
+        try:
+            line = payload_to_line(decode_message(msg.topic, msg.payload), args.measurement)
+        except (ValueError, UnicodeDecodeError, RuntimeError):
+            stats.incr("rejects")
+            logging.debug("skip invalid payload on %s: %r", msg.topic, msg.payload[:200])
+            return
+        # Runs on paho's network thread: never block it, or keepalives and acks stall too.
+        try:
+            lines_q.put_nowait(line)
+        except queue.Full:
+            stats.incr("dropped")
+
+    if hasattr(mqtt, "CallbackAPIVersion"):
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=args.mqtt_client_id)
+    else:
+        client = mqtt.Client(client_id=args.mqtt_client_id, clean_session=True)
+    client.on_connect = on_connect
+    client.on_message = on_message
+
+    logging.info(
+        "Writing Influx: %s org=%s bucket=%s measurement=%s",
+        args.influx_url,
+        args.influx_org,
+        args.influx_bucket,
+        args.measurement,
+    )
+    writer_thread = threading.Thread(
+        target=_writer_loop,
+        args=(lines_q, writer, max(1, args.batch_size), max(0.0, args.flush_interval_ms / 1000.0), stop),
+        name="influx-writer",
+    )
+    writer_thread.start()
+    stats_server = _serve_stats(args.stats_port, stats) if args.stats_port else None
+
+    shutdown = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: shutdown.set())
+
+    client.connect(args.mqtt_host, args.mqtt_port, keepalive=60)
+    client.loop_start()
+    try:
+        while not shutdown.wait(max(1.0, args.stats_interval)):
+            logging.info("stats %s queued=%d", json.dumps(stats.snapshot()), lines_q.qsize())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logging.info("Shutting down; flushing %d queued lines", lines_q.qsize())
+        client.loop_stop()
+        client.disconnect()
+        stop.set()
+        writer_thread.join()
+        writer.close()
+        if stats_server:
+            stats_server.shutdown()
+        logging.info("final stats %s", json.dumps(stats.snapshot()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
+# Superseded by mqtt_to_influx_bridge.py (persistent connection, batching, retries);
+# kept as a dependency-free fallback. Both read the same environment variables.
+
 # MQTT source
 MQTT_BROKER="${MQTT_BROKER:-10.0.40.101}"
 MQTT_PORT="${MQTT_PORT:-1883}"
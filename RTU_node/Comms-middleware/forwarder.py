@@ -0,0 +1,240 @@
+"""
+Forwards COSEM data received by the hub to the fog layer.
+
+Each decoded frame becomes one flat telemetry payload, the same shape
+mqtt_ver/main.py publishes ({"measurement", "node_id", "timestamp",
+<fields>...}), so LoRa RTUs are stored in the same place as MQTT RTUs.
+Their fields are keyed <sensor>_<metric>, not the fog model's features,
+so the fog scorer skips them; they are stored, not scored.
+
+Payloads go through a bounded buffer to a single sender thread. The
+sender holds one persistent connection (MQTT client or HTTP pool to
+InfluxDB) and sends in batches. When the sink is down the sender retries
+the batch in place. The buffer fills and submit() blocks for up to
+put_timeout, which pushes back on the hub worker. Only then are payloads
+dropped (and counted). A batch InfluxDB rejects outright (4xx other than
+429: bad line protocol, wrong token, missing bucket) is logged and dropped
+instead, since retrying it can never succeed.
+
+Forwarding is off unless HUB_FORWARD is set to mqtt or influx, so the hub
+behaves as before for existing deployments.
+"""
+
+import json
+import math
+import os
+import queue
+import threading
+import time
+from urllib.parse import urlencode
+
+MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
+MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
+MQTT_TOPIC_PREFIX = os.getenv("HUB_TOPIC_PREFIX", "solar/rtu")
+MEASUREMENT = os.getenv("MEASUREMENT", "solar_rtu")
+
+INFLUXDB_URL = os.getenv("INFLUXDB_URL", "http://localhost:8086")
+INFLUXDB_ORG = os.getenv("INFLUXDB_ORG", "SOLAR-FOG")
+INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET", "metrics")
+INFLUXDB_TOKEN = os.getenv("INFLUXDB_TOKEN", "")
+
+# Same retryable statuses as the fog MQTT bridge; any other 4xx is final
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RejectedBatch(Exception):
+    """The sink refused a batch in a way that retrying cannot fix."""
+
+
+def _sane(value):
+    value = str(value)
+    for ch in " ,=":
+        value = value.replace(ch, "_")
+    return value
+
+
+def frame_to_payload(node, device_id, epoch, objects, measurement=MEASUREMENT):
+    """Flatten one decoded frame into a telemetry payload keyed <sensor>_<metric>."""
+    payload = {
+        "measurement": measurement,
+        "node_id": node,
+        "timestamp": epoch,
+        "rtu_device_id": device_id,
+    }
+    for obj in objects:
+        payload[f"{obj['sensor']}_{obj['metric']}"] = obj["value"]
+    return payload
+
+
+class MqttSink:
+    """Publishes each payload to <prefix>/<node_id> over one persistent MQTT session."""
+
+    def __init__(self, host=MQTT_BROKER, port=MQTT_PORT, topic_prefix=MQTT_TOPIC_PREFIX, qos=1, client_id=None):
+        import paho.mqtt.client as mqtt
+
+        self.topic_prefix = topic_prefix.rstrip("/")
+        self.qos = qos
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id or "")
+        else:  # paho-mqtt < 2.0
+            self.client = mqtt.Client(client_id=client_id or "")
+        self.client.max_queued_messages_set(0)
+        self.client.reconnect_delay_set(min_delay=1, max_delay=30)
+        self.client.connect_async(host, port, keepalive=60)
+        self.client.loop_start()
+        print(f"Forwarding to MQTT {host}:{port} under {self.topic_prefix}/<node>")
+
+    def send(self, payloads):
+        if not self.client.is_connected():
+            raise ConnectionError("MQTT broker not connected")
+        infos = [
+            self.client.publish(f"{self.topic_prefix}/{_sane(p['node_id'])}", json.dumps(p, separators=(",", ":")), qos=self.qos)
+            for p in payloads
+        ]
+        # Publishes are pipelined; wait once for the whole batch to be acknowledged
+        for info in infos:
+            info.wait_for_publish(timeout=10)
+            if not info.is_published():
+                raise ConnectionError("MQTT publish not acknowledged")
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+class InfluxSink:
+    """Writes payloads as line protocol to InfluxDB v2 over a pooled keep-alive HTTP connection."""
+
+    def __init__(self, url=INFLUXDB_URL, org=INFLUXDB_ORG, bucket=INFLUXDB_BUCKET, token=INFLUXDB_TOKEN, timeout=10.0):
+        import urllib3
+
+        self.http = urllib3.PoolManager(maxsize=1, timeout=timeout, retries=False)
+        self.url = f"{url.rstrip('/')}/api/v2/write?" + urlencode(
+            {"org": org, "bucket": bucket, "precision": "s"}
+        )
+        self.headers = {"Content-Type": "text/plain; charset=utf-8"}
+        if token:
+            self.headers["Authorization"] = f"Token {token}"
+        print(f"Forwarding to InfluxDB {url} bucket {bucket}")
+
+    @staticmethod
+    def to_line(payload):
+        """Same field typing as the fog MQTT bridge (numbers as floats), so both paths can share a bucket."""
+        fields = []
+        for key, value in payload.items():
+            if key in ("measurement", "node_id", "timestamp") or value is None:
+                continue
+            if isinstance(value, bool):
+                fields.append(f"{_sane(key)}={str(value).lower()}")
+            elif isinstance(value, (int, float)):
+                if math.isfinite(value):
+                    fields.append(f"{_sane(key)}={value}")
+            else:
+                text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+                fields.append(f'{_sane(key)}="{text}"')
+        measurement = str(payload["measurement"]).replace(",", "\\,").replace(" ", "\\ ")
+        return f"{measurement},node_id={_sane(payload['node_id'])} {','.join(fields)} {int(payload['timestamp'])}"
+
+    def send(self, payloads):
+        body = "\n".join(self.to_line(p) for p in payloads).encode("utf-8")
+        resp = self.http.request("POST", self.url, body=body, headers=self.headers)
+        if resp.status >= 300:
+            message = f"InfluxDB write failed: HTTP {resp.status} {resp.data[:200]!r}"
+            if 400 <= resp.status < 500 and resp.status not in RETRY_STATUS:
+                raise RejectedBatch(message)
+            raise ConnectionError(message)
+
+    def close(self):
+        self.http.clear()
+
+
+class Forwarder:
+    """Bounded buffer plus one sender thread that delivers payloads to a sink in batches."""
+
+    def __init__(self, sink, queue_size=10000, batch_size=200, linger=0.5, put_timeout=2.0):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.linger = linger
+        self.put_timeout = put_timeout
+        self.sent = 0
+        self.dropped = 0
+        self.rejected = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="hub-forwarder", daemon=True)
+        self._thread.start()
+
+    def submit(self, payload):
+        """Buffer a payload, blocking up to put_timeout when the buffer is full. Returns False if dropped."""
+        try:
+            self._queue.put(payload, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                print(f"Forward buffer full, dropped {self.dropped} payloads so far")
+            return False
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=1.0)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _send(self, batch):
+        delay = 1.0
+        while True:
+            try:
+                self.sink.send(batch)
+                self.sent += len(batch)
+                return True
+            except RejectedBatch as e:
+                self.rejected += len(batch)
+                print(f"Forward rejected, dropped {len(batch)} payloads ({self.rejected} so far): {e}")
+                return False
+            except Exception as e:
+                if self._stop.is_set():
+                    print(f"Forward failed during shutdown, lost {len(batch)} payloads: {e}")
+                    return False
+                print(f"Forward failed, retrying in {delay:.0f}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._send(batch)
+
+    def close(self, timeout=10.0):
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+        self.sink.close()
+
+
+def make_forwarder(kind=None):
+    """Build the forwarder chosen by HUB_FORWARD (mqtt, influx or none, the default)."""
+    kind = (kind or os.getenv("HUB_FORWARD", "none")).lower()
+    if kind == "none":
+        return None
+    if kind == "mqtt":
+        sink = MqttSink()
+    elif kind == "influx":
+        sink = InfluxSink()
+    else:
+        raise ValueError(f"HUB_FORWARD must be mqtt, influx or none, got '{kind}'")
+    return Forwarder(
+        sink,
+        queue_size=int(os.getenv("HUB_FORWARD_QUEUE_SIZE", "10000")),
+        batch_size=int(os.getenv("HUB_FORWARD_BATCH_SIZE", "200")),
+    )
@@ -1,64 +1,127 @@
+import queue
+import threading
 import time
 import sys
 from pubsub import pub
 from meshtastic.serial_interface import SerialInterface
 from meshtastic import portnums_pb2
+from cosem_frame import decode_packet
+from forwarder import frame_to_payload, make_forwarder
 
 serial_port = '/dev/ttyUSB0'  # Replace with your Meshtastic device's serial port
+HUB_SHORT_NAME = "MG_H"
+PACKET_QUEUE_SIZE = 1000  # packets buffered between the radio callback and the worker
 
-def get_node_info(serial_port):
-    local = SerialInterface(serial_port)
-    node_info = local.nodes
-    local.close()
-    return node_info
-
-def parse_node_info(node_info):
-    print("Parsing node info...")
-    nodes = []
-    for node_id, node in node_info.items():
+class NodeIndex:
+    """
+    Node id -> short name, kept current from Meshtastic node updates.
+    Unknown senders are looked up in the interface's node DB on first sight.
+    """
+
+    def __init__(self):
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def update(self, node_id, node):
         sname = node.get('user', {}).get('shortName', 'Unknown')
-        if sname != "MG_H":
-            nodes.append({
-                'num': node_id,
-                'user': {
-                    'shortName': sname
-                }
-            })
-    return nodes
-
-def on_receive(packet, interface, node_list):
+        with self._lock:
+            if sname == HUB_SHORT_NAME:
+                self._names.pop(node_id, None)
+            else:
+                self._names[node_id] = sname
+
+    def load(self, node_info):
+        for node_id, node in node_info.items():
+            self.update(node_id, node)
+
+    def on_node_updated(self, node, interface=None):
+        node_id = node.get('user', {}).get('id')
+        if node_id:
+            self.update(node_id, node)
+
+    def lookup(self, node_id, interface=None):
+        name = self._names.get(node_id)
+        if name is None and interface is not None:
+            node = (interface.nodes or {}).get(node_id)
+            if node:
+                self.update(node_id, node)
+                name = self._names.get(node_id)
+        return name or 'Unknown'
+
+    def items(self):
+        with self._lock:
+            return list(self._names.items())
+
+def on_receive(packet, interface, nodes, forwarder=None):
     try:
-        if packet['decoded']['portnum'] == 'TEXT_MESSAGE_APP':
+        portnum = packet['decoded']['portnum']
+        if portnum == 'TEXT_MESSAGE_APP':
             message = packet['decoded']['payload'].decode('utf-8')
-            fromnum = packet['fromId']
-            shortname = next((node['user']['shortName'] for node in node_list if node['num'] == fromnum), 'Unknown')
+            shortname = nodes.lookup(packet['fromId'], interface)
             print(f"{shortname}: {message}")
+        elif portnum == 'PRIVATE_APP':
+            # One or more binary COSEM frames from an RTU (see cosem_frame.py)
+            frames = decode_packet(packet['decoded']['payload'])
+            shortname = nodes.lookup(packet['fromId'], interface)
+            for device_id, epoch, objects in frames:
+                if forwarder is not None:
+                    node = shortname if shortname != 'Unknown' else packet['fromId']
+                    forwarder.submit(frame_to_payload(node, device_id, epoch, objects))
+                else:
+                    for obj in objects:
+                        print(f"{shortname} [{device_id}]: {obj}")
     except KeyError:
         pass  # Ignore KeyError silently
     except UnicodeDecodeError:
         pass  # Ignore UnicodeDecodeError silently
+    except ValueError as e:
+        print(f"Dropped malformed COSEM frame: {e}")
+
+def packet_worker(packets, nodes, forwarder=None):
+    """Drain the packet queue off the radio thread until a None sentinel arrives."""
+    while True:
+        item = packets.get()
+        if item is None:
+            break
+        packet, interface = item
+        try:
+            on_receive(packet, interface, nodes, forwarder)
+        except Exception as e:
+            print(f"Error handling packet: {e}")
 
 def main():
     print(f"Using serial port: {serial_port}")
 
-    # Retrieve and parse node information
-    node_info = get_node_info(serial_port)
-    node_list = parse_node_info(node_info)
+    nodes = NodeIndex()
+    # COSEM frames are forwarded to MQTT/Influx when HUB_FORWARD is set (see forwarder.py)
+    forwarder = make_forwarder()
+    packets = queue.Queue(maxsize=PACKET_QUEUE_SIZE)
+    dropped = [0]
 
-    # Print node list for debugging
-    print("Node List:")
-    for node in node_list:
-        print(node)
-
-    # Subscribe the callback function to message reception
+    # The radio callback only enqueues; parsing and printing happen on the worker
     def on_receive_wrapper(packet, interface):
-        on_receive(packet, interface, node_list)
+        try:
+            packets.put_nowait((packet, interface))
+        except queue.Full:
+            dropped[0] += 1
+            if dropped[0] % 100 == 1:
+                print(f"Packet queue full, dropped {dropped[0]} packets so far")
+
+    worker = threading.Thread(target=packet_worker, args=(packets, nodes, forwarder), name="hub-packets", daemon=True)
+    worker.start()
 
     pub.subscribe(on_receive_wrapper, "meshtastic.receive")
+    pub.subscribe(nodes.on_node_updated, "meshtastic.node.updated")
     print("HUB Initialized")
-    
+
     # Set up the SerialInterface for message listening
     local = SerialInterface(serial_port)
+    nodes.load(local.nodes or {})
+
+    # Print node list for debugging
+    print("Node List:")
+    for node_id, sname in nodes.items():
+        print(node_id, sname)
 
     print("Listening....")
 
@@ -70,6 +133,11 @@ def main():
     except KeyboardInterrupt:
         print("Script terminated by user")
         local.close()
+        packets.put(None)
+        worker.join(timeout=5)
+        if forwarder is not None:
+            forwarder.close()
+            print(f"Forwarded {forwarder.sent} payloads, dropped {forwarder.dropped}, rejected {forwarder.rejected}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,6 +1,4 @@
 import time
-import json
-import os
 import math
 import random
 import RPi.GPIO as GPIO
@@ -13,24 +11,13 @@ LDR_PIN = 17
 GPIO.setmode(GPIO.BCM)
 GPIO.setup(LDR_PIN, GPIO.IN)
 
+from cosem_log import CosemLog
+
 # -------------------
-# JSON log file
+# Append-only JSON Lines log, rotated and gzipped (see cosem_log.py)
+# Old sensor_log.json arrays: python cosem_log.py import sensor_log.json
 # -------------------
-LOG_FILE = "sensor_log.json"
-
-def append_log(entry):
-    if os.path.exists(LOG_FILE):
-        with open(LOG_FILE, "r") as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                data = []
-    else:
-        data = []
-
-    data.append(entry)
-    with open(LOG_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+log = CosemLog("sensor_log.jsonl")
 
 # -------------------
 # Master polling config
@@ -95,6 +82,7 @@ try:
             ("0-0:96.7.9", "Status", status),
             ("1-0:1.8.0", "Energy", total_energy_kwh)
         ]
+        entries = []
         for obis, metric, value in metrics:
             entry = {
                 "timestamp": timestamp,
@@ -103,7 +91,7 @@ try:
                 "metric": metric,
                 "value": value
             }
-            append_log(entry)
+            entries.append(entry)
             print(f"[Inverter] {metric}: {value}")
 
         # LDR reading
@@ -114,13 +102,17 @@ try:
             "sensor": "LDR",
             "value": ldr_state
         }
-        append_log(ldr_entry)
+        entries.append(ldr_entry)
         print(f"[LDR] {ldr_state}")
 
+        # One write per poll instead of rewriting the whole file per entry
+        log.append_many(entries)
+
         time.sleep(POLL_INTERVAL)
 
 except KeyboardInterrupt:
     print("Stopping master...")
 finally:
     client.close()
+    log.close()
     GPIO.cleanup()
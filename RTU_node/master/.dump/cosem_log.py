@@ -0,0 +1,118 @@
+import glob
+import gzip
+import json
+import os
+import shutil
+import sys
+import time
+
+# -------------------
+# Append-only COSEM log (JSON Lines)
+# -------------------
+# One COSEM object per line. The active file is only ever appended to and
+# is rotated to <name>-<YYYYmmdd-HHMMSS>.<seq>.jsonl[.gz] once it exceeds
+# max_bytes or is older than max_age seconds. read_log() streams rotated
+# segments and the active file back in order.
+
+LOG_FILE = "sensor_log.jsonl"
+MAX_BYTES = 8 * 1024 * 1024
+MAX_AGE = 24 * 3600
+
+
+class CosemLog:
+    def __init__(self, path=LOG_FILE, max_bytes=MAX_BYTES, max_age=MAX_AGE, compress=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        self._opened = os.path.getmtime(self.path) if self._size else time.time()
+
+    def append_many(self, entries):
+        """Append a poll's entries with a single write."""
+        if not entries:
+            return
+        data = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in entries)
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data.encode("utf-8"))
+        if self._size >= self.max_bytes or time.time() - self._opened >= self.max_age:
+            self.rotate()
+
+    def append(self, entry):
+        self.append_many([entry])
+
+    def rotate(self):
+        self._file.close()
+        if self._size:
+            base, ext = os.path.splitext(self.path)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            n = 0
+            rotated = f"{base}-{stamp}.{n:03d}{ext}"
+            while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+                n += 1
+                rotated = f"{base}-{stamp}.{n:03d}{ext}"
+            os.replace(self.path, rotated)
+            if self.compress:
+                with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(rotated)
+        self._open()
+
+    def close(self):
+        self._file.close()
+
+
+def segments(path=LOG_FILE):
+    """Rotated segments (oldest first) followed by the active file."""
+    base, ext = os.path.splitext(path)
+    rotated = glob.glob(f"{glob.escape(base)}-*{ext}") + glob.glob(f"{glob.escape(base)}-*{ext}.gz")
+    rotated.sort(key=lambda p: p[:-3] if p.endswith(".gz") else p)
+    return rotated + ([path] if os.path.exists(path) else [])
+
+
+def read_log(path=LOG_FILE):
+    """Stream every logged COSEM object, oldest first. A torn last line (power loss) is skipped."""
+    for segment in segments(path):
+        opener = gzip.open if segment.endswith(".gz") else open
+        with opener(segment, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def import_legacy(json_path, log):
+    """Append the entries of an old indent=4 JSON array log (sensor_log.json). Returns the count.
+
+    Raises json.JSONDecodeError for a truncated or corrupt file, before anything is appended.
+    """
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    for i in range(0, len(data), 1000):
+        log.append_many(data[i:i + 1000])
+    return len(data)
+
+
+if __name__ == "__main__":
+    # python cosem_log.py import sensor_log.json   -> convert the legacy array into the JSONL log
+    # python cosem_log.py cat                      -> stream the whole log as JSON Lines
+    if len(sys.argv) >= 3 and sys.argv[1] == "import":
+        log = CosemLog()
+        try:
+            print(f"Imported {import_legacy(sys.argv[2], log)} entries into {LOG_FILE}")
+        except json.JSONDecodeError as e:
+            print(f"❌ {sys.argv[2]} is not a valid JSON array log, nothing imported: {e}")
+            sys.exit(1)
+        finally:
+            log.close()
+    elif len(sys.argv) >= 2 and sys.argv[1] == "cat":
+        for entry in read_log():
+            print(json.dumps(entry))
+    else:
+        print("usage: cosem_log.py import <sensor_log.json> | cat")
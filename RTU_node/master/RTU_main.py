@@ -1,64 +1,83 @@
 import json
+import os
+import sys
 # import meshtastic.serial_interface
-from modbus_master import connect_modbus, read_inverter_metrics
-# In future: from sensor_x import read_sensor_data
-from sensor_modules import BH1750, DS18B20, ACS712
-import time
+# from meshtastic import portnums_pb2
+from modbus_master import ModbusPoller, SLAVES
+
+# Frame codec is shared with the hub in Comms-middleware
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Comms-middleware"))
+from cosem_frame import FramePacker, MAX_PAYLOAD
+from sensor_modules import LocalSensors
+
+# RTU identifier carried in every binary frame header
+DEVICE_ID = int(os.getenv("RTU_DEVICE_ID", "1"))
+# Hold partly filled packets up to this many seconds so later polls can share them (0 = send every cycle)
+PACK_MAX_DELAY = float(os.getenv("RTU_PACK_MAX_DELAY", "0"))
+# On-board sensors are polled with the slaves every this many seconds (0 = Modbus slaves only)
+SENSOR_INTERVAL = float(os.getenv("RTU_SENSOR_INTERVAL", "5"))
+# Comma-separated 1-Wire ids (28-...) of the DS18B20s to read; empty = the first one found
+DS18B20_IDS = [i.strip() for i in os.getenv("RTU_DS18B20_IDS", "").split(",") if i.strip()]
+# ACS712 on the ADS1115: model 05B/20A/30A (empty = not fitted), ADC channel, rms (AC) or mean (DC)
+ACS712_MODEL = os.getenv("RTU_ACS712_MODEL", "20A")
+ACS712_CHANNEL = int(os.getenv("RTU_ACS712_CHANNEL", "0"))
+ACS712_MODE = os.getenv("RTU_ACS712_MODE", "rms")
+
+packer = FramePacker(DEVICE_ID, max_payload=int(os.getenv("RTU_MAX_PAYLOAD", str(MAX_PAYLOAD))), max_delay=PACK_MAX_DELAY)
+
+def send_packets(iface, packets):
+    for packet in packets:
+        print(f"📦 Sending {len(packet)} byte packet")
+        # iface.sendData(packet, portNum=portnums_pb2.PortNum.PRIVATE_APP)
 
 def send_cosem_objects(iface, cosem_data):
     """
-    Accepts either a single COSEM dict or a list of dicts,
-    normalizes to a list, then sends each as JSON over LoRa.
+    Accepts either a single COSEM dict or a list of dicts and buffers them
+    in the packer, which fills each LoRa packet up to the Meshtastic payload
+    limit (see cosem_frame). Objects the frame table does not know are sent
+    as JSON text as before.
     """
     if isinstance(cosem_data, dict):
         cosem_data = [cosem_data]  # wrap single object in list
 
-    for obj in cosem_data:
+    leftovers = packer.add(cosem_data)
+    send_packets(iface, packer.ready())
+
+    for obj in leftovers:
         print(obj)
         # payload = json.dumps(obj)
         # iface.sendText(payload)
         # print("✅ Sent:", payload)
 
-def main(poll_interval=1):
+def main():
     # Connect LoRa interface
     # iface = meshtastic.serial_interface.SerialInterface()
 
-    # Connect Modbus (example)
-    try:
-        modbus_client = connect_modbus(ip="127.0.0.1", port=1502)
-        print("✅ Modbus connected")
-    except Exception as e:
-        print(f"⚠ Could not connect Modbus slave: {e}")
-        modbus_client = None
-        exit(1)
+    # Each slave in SLAVES is read concurrently on its own poll_interval/timeout,
+    # so one slow device no longer delays the others.
+    sensors = LocalSensors(DS18B20_IDS, ACS712_MODEL, ACS712_CHANNEL, ACS712_MODE) if SENSOR_INTERVAL > 0 else None
+    sources = {"sensors": (sensors.read_cosem, SENSOR_INTERVAL)} if sensors else None
+    poller = ModbusPoller(SLAVES, sources=sources)
+    poller.connect()
 
-    # List of data source functions
-    # Each function returns either a dict or a list of COSEM objects
-    data_sources = [
-        lambda: read_slave_metrics(modbus_client) if modbus_client else None,
-        # read_ldr,
-        # read_ct,
-        # Add more sensor functions here
-    ]
+    def handle(name, result):
+        try:
+            if result:
+                send_cosem_objects(0, result)
+        except Exception as e:
+            print(f"⚠ Error sending data from {name}: {e}")
 
     print("🔄 Starting main loop...")
     try:
-        while True:
-            for func in data_sources:
-                try:
-                    result = func()
-                    if result:
-                        send_cosem_objects(0, result)
-                except Exception as e:
-                    print(f"⚠ Error in data source {func.__name__ if hasattr(func, '__name__') else func}: {e}")
-
-            time.sleep(poll_interval)
-
+        poller.poll_forever(handle)
     except KeyboardInterrupt:
         print("\n⏹ Stopping client...")
+        print(poller.stats())
     finally:
-        if modbus_client:
-            modbus_client.close()
+        send_packets(0, packer.flush())
+        poller.close()
+        if sensors:
+            sensors.close()
 
 if __name__ == "__main__":
     main()
@@ -1,28 +1,38 @@
 import time
-import math
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pymodbus.client.sync import ModbusTcpClient
+from register_map import load_register_maps
 
 # -------------------
 # Slave configurations
 # -------------------
+# device_type selects an entry in register_maps.json (defaults to the slave name)
+# poll_interval and timeout are in seconds and optional (see DEFAULT_POLL_INTERVAL / DEFAULT_TIMEOUT)
 SLAVES = {
-    "inverter": {"ip": "127.0.0.1", "port": 1502, "unit_id": 1, "num_regs": 4},
-    "bms": {"ip": "127.0.0.1", "port": 1503, "unit_id": 10, "num_regs": 5}
+    "inverter": {"ip": "127.0.0.1", "port": 1502, "unit_id": 1, "device_type": "inverter", "poll_interval": 1.0, "timeout": 0.5},
+    "bms": {"ip": "127.0.0.1", "port": 1503, "unit_id": 10, "device_type": "bms", "poll_interval": 5.0, "timeout": 0.5}
 }
 
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_TIMEOUT = 1.0
+
+# -------------------
+# Register maps, compiled once at startup
+# -------------------
+DECODERS = load_register_maps()
+
 # -------------------
 # Slave state for energy or delta calculations
 # -------------------
-_slave_state = {
-    "inverter": {"_total_energy_wh": 0, "_last_time": time.time()},
-    "bms": {"_last_time": time.time()}
-}
+_slave_state = {name: {"_last_time": time.time()} for name in SLAVES}
 
 # -------------------
 # Connect to Modbus TCP slave
 # -------------------
-def connect_modbus(ip, port):
-    client = ModbusTcpClient(ip, port=port)
+def connect_modbus(ip, port, timeout=DEFAULT_TIMEOUT):
+    client = ModbusTcpClient(ip, port=port, timeout=timeout)
     if not client.connect():
         raise ConnectionError(f"❌ Could not connect to Modbus slave {ip}:{port}")
     return client
@@ -30,91 +40,171 @@ def connect_modbus(ip, port):
 # -------------------
 # Read metrics per slave
 # -------------------
-def read_slave_metrics(client, slave_name, unit_id, num_registers):
-    state = _slave_state[slave_name]
-    rr = client.read_holding_registers(0, num_registers, unit=unit_id)
-    if rr.isError():
-        raise RuntimeError(f"Error reading {slave_name} registers: {rr}")
+def read_slave_metrics(client, slave_name, unit_id, device_type=None):
+    decoder = DECODERS[device_type or slave_name]
+    state = _slave_state.setdefault(slave_name, {"_last_time": time.time()})
+    block_registers = []
+    for block in decoder.blocks:
+        read = client.read_input_registers if block.table == "input" else client.read_holding_registers
+        rr = read(block.start, block.count, unit=unit_id)
+        if rr.isError():
+            raise RuntimeError(f"Error reading {slave_name} {block.table} registers {block.start}+{block.count}: {rr}")
+        block_registers.append(rr.registers)
 
     timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    cosem_objects = []
-
-    if slave_name == "inverter":
-        voltage, current, power, status = rr.registers
-        # Energy calculation
-        now = time.time()
-        delta_hours = (now - state["_last_time"]) / 3600
-        state["_last_time"] = now
-        state["_total_energy_wh"] += power * delta_hours
-        total_energy_kwh = round(state["_total_energy_wh"] / 1000, 4)
-
-        # Apparent & Reactive power
-        S = voltage * current
-        Q = round(math.sqrt(max(0, S**2 - power**2)), 2)
-        PF = round(power / S if S != 0 else 0, 3)
-
-        metrics = [
-            ("1-0:32.7.0", "Voltage", voltage),
-            ("1-0:31.7.0", "Current", current),
-            ("1-0:21.7.0", "ActivePower", power),
-            ("1-0:22.7.0", "ApparentPower", S),
-            ("1-0:23.7.0", "ReactivePower", Q),
-            ("1-0:25.7.0", "PowerFactor", PF),
-            ("0-0:96.7.9", "Status", status),
-            ("1-0:1.8.0", "Energy", total_energy_kwh)
-        ]
-
-    elif slave_name == "bms":
-        pack_voltage, pack_current, soc, temp, status = rr.registers
-        metrics = [
-            ("1-0:32.7.0", "PackVoltage", pack_voltage),
-            ("1-0:31.7.0", "PackCurrent", pack_current),
-            ("1-0:51.7.0", "SOC", soc),
-            ("1-0:52.7.0", "Temperature", temp),
-            ("0-0:96.7.9", "Status", status)
-        ]
-
-    # Convert to COSEM-style dicts
-    for obis, metric, value in metrics:
-        cosem_objects.append({
-            "timestamp": timestamp,
-            "obis_code": obis,
-            "sensor": slave_name.capitalize(),
-            "metric": metric,
-            "value": value
-        })
-
-    return cosem_objects
+    values = decoder.decode(block_registers, state)
+    return decoder.to_cosem(values, timestamp)
+
+# -------------------
+# Concurrent poller
+# -------------------
+class ModbusPoller:
+    """
+    Polls every slave in SLAVES concurrently, each on its own schedule.
+
+    Each device gets its own TCP client and poll_interval/timeout. Deadlines
+    are kept on a monotonic clock and advanced by whole intervals, so a slow
+    read never shifts the cadence of the other devices or of later polls.
+    A deadline is counted as missed when the previous read of that device is
+    still in flight or the scheduler woke up more than one interval late.
+
+    sources maps extra names to (read, interval) for readers that are not
+    Modbus slaves, such as the RTU's on-board sensors; read() returns COSEM
+    objects and is scheduled exactly like a slave.
+    """
+
+    def __init__(self, slaves=None, max_workers=None, sources=None):
+        self.slaves = slaves if slaves is not None else SLAVES
+        self.sources = sources or {}
+        self.clients = {}
+        self.devices = {}
+        self.results = queue.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(1, len(self.slaves) + len(self.sources)),
+            thread_name_prefix="modbus-poll",
+        )
+
+    def _add_device(self, name, interval, start):
+        self.devices[name] = {
+            "interval": interval,
+            "next_due": start,
+            "future": None,
+            "polls": 0,
+            "errors": 0,
+            "missed": 0,
+            "last_latency": None,
+            "last_lateness": None,
+        }
+
+    def connect(self):
+        """Connect every slave; devices that fail are retried on their next poll."""
+        start = time.monotonic()
+        for name, (_, interval) in self.sources.items():
+            self._add_device(name, interval, start)
+        for name, cfg in self.slaves.items():
+            timeout = cfg.get("timeout", DEFAULT_TIMEOUT)
+            self._add_device(name, cfg.get("poll_interval", DEFAULT_POLL_INTERVAL), start)
+            try:
+                self.clients[name] = connect_modbus(cfg["ip"], cfg["port"], timeout=timeout)
+                print(f"✅ Connected to {name} at {cfg['ip']}:{cfg['port']} (Unit ID={cfg['unit_id']})")
+            except ConnectionError as e:
+                print(f"⚠ {e}; will retry on next poll")
+                self.clients[name] = ModbusTcpClient(cfg["ip"], port=cfg["port"], timeout=timeout)
+
+    def _read(self, name, scheduled):
+        started = time.monotonic()
+        try:
+            if name in self.sources:
+                data = self.sources[name][0]()
+            else:
+                cfg = self.slaves[name]
+                data = read_slave_metrics(
+                    self.clients[name],
+                    slave_name=name,
+                    unit_id=cfg["unit_id"],
+                    device_type=cfg.get("device_type")
+                )
+            error = None
+        except Exception as e:
+            data, error = None, e
+        self.results.put((name, data, error, started - scheduled, time.monotonic() - started))
+
+    def _schedule_due(self, now):
+        for name, dev in self.devices.items():
+            if now < dev["next_due"]:
+                continue
+
+            if dev["future"] is not None and not dev["future"].done():
+                dev["missed"] += 1
+                print(f"⚠ {name}: previous read still running, skipped deadline")
+            else:
+                dev["future"] = self._executor.submit(self._read, name, dev["next_due"])
+
+            # Advance by whole intervals from the old deadline (not from now) to avoid drift
+            late = now - dev["next_due"]
+            skipped = int(late // dev["interval"])
+            if skipped:
+                dev["missed"] += skipped
+                print(f"⚠ {name}: scheduler {late:.3f}s late, missed {skipped} deadline(s)")
+            dev["next_due"] += (skipped + 1) * dev["interval"]
+
+    def poll_forever(self, handle, stop_event=None):
+        """
+        Run the scheduler until stop_event is set.
+        handle(name, cosem_objects) is called on this thread for every successful read.
+        """
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            self._schedule_due(time.monotonic())
+
+            wait = max(0.0, min(d["next_due"] for d in self.devices.values()) - time.monotonic())
+            try:
+                name, data, error, lateness, latency = self.results.get(timeout=wait)
+            except queue.Empty:
+                continue
+
+            while True:
+                dev = self.devices[name]
+                dev["polls"] += 1
+                dev["last_latency"] = latency
+                dev["last_lateness"] = lateness
+                if error is not None:
+                    dev["errors"] += 1
+                    print(f"⚠ Error reading {name}: {error}")
+                else:
+                    handle(name, data)
+                try:
+                    name, data, error, lateness, latency = self.results.get_nowait()
+                except queue.Empty:
+                    break
+
+    def stats(self):
+        return {
+            name: {k: dev[k] for k in ("interval", "polls", "errors", "missed", "last_latency", "last_lateness")}
+            for name, dev in self.devices.items()
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for c in self.clients.values():
+            c.close()
 
 # -------------------
 # Main loop
 # -------------------
 if __name__ == "__main__":
-    clients = {}
+    poller = ModbusPoller(SLAVES)
     try:
-        # Connect all slaves
-        for name, cfg in SLAVES.items():
-            clients[name] = connect_modbus(cfg["ip"], cfg["port"])
-            print(f"✅ Connected to {name} at {cfg['ip']}:{cfg['port']} (Unit ID={cfg['unit_id']})")
+        poller.connect()
 
-        while True:
-            for name, cfg in SLAVES.items():
-                try:
-                    data = read_slave_metrics(
-                        clients[name],
-                        slave_name=name,
-                        unit_id=cfg["unit_id"],
-                        num_registers=cfg["num_regs"]
-                    )
-                    for obj in data:
-                        print(obj)
-                except Exception as e:
-                    print(f"⚠ Error reading {name}: {e}")
-
-            time.sleep(1)  # Poll interval
+        def print_objects(name, data):
+            for obj in data:
+                print(obj)
+
+        poller.poll_forever(print_objects)
 
     except KeyboardInterrupt:
         print("\n⏹ Stopping master...")
+        print(poller.stats())
     finally:
-        for c in clients.values():
-            c.close()
+        poller.close()
@@ -0,0 +1,177 @@
+import json
+import math
+import os
+import struct
+import time
+from collections import namedtuple
+
+# -------------------
+# Register map location
+# -------------------
+REGISTER_MAP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "register_maps.json")
+
+# Modbus read PDU limit (registers per request) and default tolerated gap between fields
+MAX_READ_REGISTERS = 125
+DEFAULT_MAX_GAP = 8
+
+REGISTER_TABLES = ("holding", "input")
+
+# struct codes per register count (unsigned; lower-cased when "signed") and for IEEE floats
+_INT_FORMATS = {1: "H", 2: "I", 4: "Q"}
+_FLOAT_FORMATS = {2: "f", 4: "d"}
+
+
+def _field_format(device_type, field):
+    count = field.get("count", 1)
+    if field.get("float", False):
+        code = _FLOAT_FORMATS.get(count)
+    else:
+        code = _INT_FORMATS.get(count)
+        if code and field.get("signed", False):
+            code = code.lower()
+    if code is None:
+        raise ValueError(f"{device_type}.{field['metric']}: unsupported register count {count}")
+    return code
+
+
+# -------------------
+# Derived metrics
+# Each takes the device state dict followed by the values named in "args"
+# -------------------
+def _apparent_power(state, voltage, current):
+    return voltage * current
+
+
+def _reactive_power(state, apparent, active):
+    return round(math.sqrt(max(0, apparent**2 - active**2)), 2)
+
+
+def _power_factor(state, active, apparent):
+    return round(active / apparent if apparent != 0 else 0, 3)
+
+
+def _energy_kwh(state, power):
+    now = time.time()
+    delta_hours = (now - state.setdefault("_last_time", now)) / 3600
+    state["_last_time"] = now
+    state["_total_energy_wh"] = state.get("_total_energy_wh", 0) + power * delta_hours
+    return round(state["_total_energy_wh"] / 1000, 4)
+
+
+DERIVED_FUNCTIONS = {
+    "apparent_power": _apparent_power,
+    "reactive_power": _reactive_power,
+    "power_factor": _power_factor,
+    "energy_kwh": _energy_kwh,
+}
+
+
+# One Modbus request: table ("holding"/"input"), first address, register count, and the fields it covers
+ReadBlock = namedtuple("ReadBlock", ["table", "start", "count", "fields"])
+
+
+def plan_reads(fields, max_gap=DEFAULT_MAX_GAP, max_registers=MAX_READ_REGISTERS):
+    """
+    Merge register fields into the fewest read requests.
+
+    Fields in the same table are merged while the hole between them is at
+    most max_gap registers and the request stays within max_registers.
+    """
+    blocks = []
+    for table in REGISTER_TABLES:
+        current = None
+        for field in sorted((f for f in fields if f.get("table", "holding") == table), key=lambda f: f["address"]):
+            end = field["address"] + field.get("count", 1)
+            if current is not None:
+                start, count, members = current
+                gap = field["address"] - (start + count)
+                if gap < 0:
+                    raise ValueError(f"{field['metric']}: overlaps previous register")
+                if gap <= max_gap and end - start <= max_registers:
+                    current = (start, end - start, members + [field])
+                    continue
+                blocks.append(ReadBlock(table, start, count, members))
+            current = (field["address"], end - field["address"], [field])
+        if current is not None:
+            blocks.append(ReadBlock(table, *current))
+    return blocks
+
+
+class RegisterDecoder:
+    """
+    Decoder compiled once from a device register map.
+
+    Fields are planned into coalesced read blocks (see plan_reads); each
+    block is decoded with a single precompiled struct (gaps are skipped as
+    pad bytes), then scaled and expanded into COSEM objects.
+    """
+
+    def __init__(self, device_type, spec):
+        self.device_type = device_type
+        self.sensor = spec.get("sensor", device_type.capitalize())
+
+        fields = spec["registers"]
+        if not fields:
+            raise ValueError(f"Register map '{device_type}' has no registers")
+        for field in fields:
+            if field.get("table", "holding") not in REGISTER_TABLES:
+                raise ValueError(f"{device_type}.{field['metric']}: table must be one of {REGISTER_TABLES}")
+
+        self.blocks = plan_reads(
+            fields,
+            max_gap=spec.get("max_gap", DEFAULT_MAX_GAP),
+            max_registers=min(spec.get("max_registers", MAX_READ_REGISTERS), MAX_READ_REGISTERS),
+        )
+
+        # Per block: (pack struct for the raw registers, unpack struct, decode plan for its fields)
+        self._block_codecs = []
+        for block in self.blocks:
+            fmt = ">"
+            cursor = block.start
+            plan = []
+            for field in block.fields:
+                fmt += "xx" * (field["address"] - cursor) + _field_format(device_type, field)
+                cursor = field["address"] + field.get("count", 1)
+                plan.append((field["metric"], field.get("scale", 1), field.get("round")))
+            self._block_codecs.append((struct.Struct(f">{block.count}H"), struct.Struct(fmt), tuple(plan)))
+
+        self.metrics = tuple(f["metric"] for f in fields)
+
+        self._derived = []
+        for d in spec.get("derived", []):
+            if d["fn"] not in DERIVED_FUNCTIONS:
+                raise ValueError(f"{device_type}.{d['metric']}: unknown derived fn '{d['fn']}'")
+            self._derived.append((d["metric"], DERIVED_FUNCTIONS[d["fn"]], tuple(d["args"])))
+
+        # (metric, obis) pairs in output order: registers as declared, then derived metrics
+        self._outputs = tuple((f["metric"], f["obis"]) for f in fields) + tuple(
+            (d["metric"], d["obis"]) for d in spec.get("derived", [])
+        )
+
+    def decode(self, block_registers, state):
+        """Return {metric: value} given the registers read for each of self.blocks, in order."""
+        values = {}
+        for registers, (pack, unpack, plan) in zip(block_registers, self._block_codecs):
+            raw = unpack.unpack(pack.pack(*registers[:pack.size // 2]))
+            for (metric, scale, digits), value in zip(plan, raw):
+                if scale != 1:
+                    value = value * scale
+                if digits is not None:
+                    value = round(value, digits)
+                values[metric] = value
+        for metric, fn, args in self._derived:
+            values[metric] = fn(state, *(values[a] for a in args))
+        return values
+
+    def to_cosem(self, values, timestamp):
+        return [
+            {"timestamp": timestamp, "obis_code": obis, "sensor": self.sensor, "metric": metric, "value": values[metric]}
+            for metric, obis in self._outputs
+        ]
+
+
+def load_register_maps(path=REGISTER_MAP_FILE):
+    """Compile every device type in a register-map JSON file into a RegisterDecoder."""
+    with open(path, "r") as f:
+        specs = json.load(f)
+    return {device_type: RegisterDecoder(device_type, spec) for device_type, spec in specs.items()}
@@ -1,113 +1,122 @@
-import smbus2
 import time
-import os
-import glob
-import Adafruit_ADS1x15
-import math
+# The drivers themselves are shared with mqtt_ver (pip install ../../common); this
+# module only turns their readings into COSEM objects for the LoRa client.
+import rtu_sensors
 
-class BH1750:
+
+def _cosem(obis_code, sensor, metric, value):
+    return {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "obis_code": obis_code,
+        "sensor": sensor,
+        "metric": metric,
+        "value": value
+    }
+
+class BH1750(rtu_sensors.BH1750):
     """Digital light sensor BH1750"""
-    
-    def __init__(self, i2c_address=0x23, bus=1):
-        self.i2c_address = i2c_address
-        self.bus = smbus2.SMBus(bus)
-        self.is_connected = self._check_connection()
-    
-    def _check_connection(self):
-        try:
-            self.bus.read_byte(self.i2c_address)
-            return True
-        except OSError:
-            return False
-    
+
+    def read_lux(self):
+        return self.read()
+
     def read_cosem(self):
         """Return COSEM-style dict for LoRa client"""
-        if not self.is_connected:
-            raise RuntimeError("BH1750 not connected")
-        
-        self.bus.write_byte(self.i2c_address, 0x10)  # high-res mode
-        time.sleep(0.18)
-        data = self.bus.read_i2c_block_data(self.i2c_address, 0x00, 2)
-        lux = (data[0] << 8 | data[1]) / 1.2
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        
-        return {
-            "timestamp": timestamp,
-            "obis_code": "1-0:99.99.2",  # Example OBIS for light
-            "sensor": "BH1750",
-            "metric": "Illuminance",
-            "value": round(lux, 2)
-        }
-
-class DS18B20:
-    """Temperature sensor"""
-    
-    def __init__(self, sensor_id=None):
-        os.system('modprobe w1-gpio')
-        os.system('modprobe w1-therm')
-        self.base_dir = '/sys/bus/w1/devices/'
-        self.device_folder = self._find_sensor(sensor_id)
-        self.is_connected = self.device_folder is not None
-    
-    def _find_sensor(self, sensor_id):
-        folders = glob.glob(self.base_dir + '28*')
-        if not folders:
-            return None
-        if sensor_id:
-            target = self.base_dir + sensor_id
-            return target if target in folders else None
-        return folders[0]
-    
-    def _read_raw(self):
-        with open(self.device_folder + '/w1_slave', 'r') as f:
-            return f.readlines()
-    
+        return _cosem("1-0:99.99.2", "BH1750", "Illuminance", self.read_lux())  # Example OBIS for light
+
+class DS18B20(rtu_sensors.DS18B20):
+    """Temperature sensor
+
+    trigger_conversion() starts a conversion on every sensor on the 1-Wire bus
+    at once (w1-therm bulk read); collect_cosem() then reads each result in a
+    few ms, so many sensors cost one 750 ms conversion instead of one each.
+    """
+
+    def collect_cosem(self):
+        """COSEM dict from the last triggered conversion (does not start a new one)"""
+        return _cosem("1-0:99.99.3", "DS18B20", "Temperature", self.collect())  # Example OBIS for temperature
+
     def read_cosem(self):
         """Return COSEM-style dict for LoRa client"""
-        if not self.is_connected:
-            raise RuntimeError("DS18B20 not connected")
-        lines = self._read_raw()
-        while lines[0].strip()[-3:] != 'YES':
-            time.sleep(0.2)
-            lines = self._read_raw()
-        equals_pos = lines[1].find('t=')
-        if equals_pos == -1:
-            raise RuntimeError("Invalid DS18B20 data")
-        temp_c = float(lines[1][equals_pos+2:]) / 1000.0
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        return {
-            "timestamp": timestamp,
-            "obis_code": "1-0:99.99.3",  # Example OBIS for temperature
-            "sensor": "DS18B20",
-            "metric": "Temperature",
-            "value": round(temp_c, 2)
-        }
-
-class ACS712:
-    """Current sensor"""
-    
-    SENSITIVITY = {'05B': 185, '20A': 100, '30A': 66}
-    
-    def __init__(self, adc_channel=0, model='20A', adc_gain=1):
-        if model not in self.SENSITIVITY:
-            raise ValueError("Invalid model")
-        self.adc_channel = adc_channel
-        self.model = model
-        self.sensitivity = self.SENSITIVITY[model]
-        self.adc = Adafruit_ADS1x15.ADS1115()
-        self.adc_gain = adc_gain
-        self.is_connected = True
-        self.zero_voltage = 2.5  # default zero voltage
-    
+        return _cosem("1-0:99.99.3", "DS18B20", "Temperature", self.read())
+
+    @classmethod
+    def read_all_cosem(cls, sensors, timeout=1.0):
+        """One bus-wide conversion, then a COSEM dict per sensor (failed sensors are skipped)"""
+        base_dir = sensors[0].base_dir if sensors else '/sys/bus/w1/devices/'
+        triggered = cls.trigger_conversion(base_dir)
+        if triggered:
+            cls.wait_for_conversion(timeout, base_dir)
+        objects = []
+        for sensor in sensors:
+            try:
+                objects.append(sensor.collect_cosem() if triggered else sensor.read_cosem())
+            except (OSError, ValueError, RuntimeError) as e:
+                print(f"⚠ DS18B20 {sensor.device_folder}: {e}")
+        return objects
+
+class ACS712(rtu_sensors.ACS712):
+    """Current sensor
+
+    read_cosem() takes one ADS1115 sample unless start_sampling() is running,
+    in which case the value is the RMS (or mean) over the last window.
+    """
+
+    def read_current(self):
+        return self.read()
+
+    def read_cosem(self):
+        return _cosem("1-0:99.99.4", "ACS712", "Current", self.read_current())  # Example OBIS for current
+
+class LocalSensors:
+    """The RTU's on-board sensors, read together as one batch of COSEM objects
+
+    Sensors that are missing or fail to initialise are skipped. All DS18B20s
+    share one bus-wide conversion per read_cosem(). The ACS712 samples in the
+    background from construction until close(), so each reading is the RMS
+    (or mean) current over the last window rather than one ADC sample.
+    """
+
+    def __init__(self, ds18b20_ids=None, acs712_model='20A', acs712_channel=0, acs712_mode="rms"):
+        self.bh1750 = self._open(BH1750)
+        self.ds18b20 = [s for s in (self._open(DS18B20, i) for i in (ds18b20_ids or [None])) if s is not None]
+        self.acs712 = self._open(ACS712, adc_channel=acs712_channel, model=acs712_model) if acs712_model else None
+        if self.acs712 is not None:
+            try:
+                self.acs712.start_sampling(mode=acs712_mode)
+            except OSError as e:
+                print(f"⚠ ACS712 continuous sampling unavailable, using single samples: {e}")
+
+    @staticmethod
+    def _open(cls, *args, **kwargs):
+        try:
+            sensor = cls(*args, **kwargs)
+        except Exception as e:
+            print(f"⚠ {cls.__name__} unavailable: {e}")
+            return None
+        if not sensor.is_connected:
+            print(f"⚠ {cls.__name__} not connected")
+            return None
+        print(f"✅ {cls.__name__}: {sensor.status()}")
+        return sensor
+
     def read_cosem(self):
-        adc_val = self.adc.read_adc(self.adc_channel, gain=self.adc_gain)
-        voltage = (adc_val * 4.096) / 32767.0
-        current = (voltage - self.zero_voltage) * 1000 / self.sensitivity
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        return {
-            "timestamp": timestamp,
-            "obis_code": "1-0:99.99.4",  # Example OBIS for current
-            "sensor": "ACS712",
-            "metric": "Current",
-            "value": round(current, 3)
-        }
+        objects = []
+        if self.bh1750 is not None:
+            try:
+                objects.append(self.bh1750.read_cosem())
+            except (OSError, RuntimeError) as e:
+                print(f"⚠ BH1750: {e}")
+        if self.ds18b20:
+            objects.extend(DS18B20.read_all_cosem(self.ds18b20))
+        if self.acs712 is not None:
+            try:
+                objects.append(self.acs712.read_cosem())
+            except (OSError, RuntimeError) as e:
+                print(f"⚠ ACS712: {e}")
+        return objects
+
+    def close(self):
+        if self.acs712 is not None:
+            self.acs712.stop_sampling()
+        if self.bh1750 is not None:
+            self.bh1750.power_down()
@@ -0,0 +1,450 @@
+"""
+BH1750, DS18B20 and ACS712 drivers for the Raspberry Pi RTUs.
+
+This is the only implementation: mqtt_ver/sensor_classes.py re-exports it and
+RTU_node/master/sensor_modules.py wraps it in COSEM objects. Wiring and
+calibration notes are in RTU_node/sensors/sensors.md.
+"""
+
+import smbus2
+import time
+import os
+import glob
+import json
+import threading
+
+try:  # only ACS712 needs the ADC driver and NumPy (pip install "./common[sensors]")
+    import numpy as np
+    import Adafruit_ADS1x15
+except ImportError:
+    np = Adafruit_ADS1x15 = None
+
+class BH1750:
+    """Real implementation for BH1750 digital light sensor"""
+    
+    POWER_ON = 0x01
+    CONTINUOUS_HIGH_RES = 0x10   # new 1 lx sample every ~120 ms, sensor stays powered
+    ONE_TIME_HIGH_RES = 0x20     # single sample, then power down
+    MEASUREMENT_TIME = 0.18      # worst-case high-res conversion time (s)
+    
+    def __init__(self, i2c_address=0x23, bus=1, continuous=True):
+        """
+        :param continuous: start continuous measurement once so read() only
+                           fetches the latest 2-byte result (~1 ms) instead of
+                           triggering and waiting 180 ms per call
+        """
+        self.i2c_address = i2c_address
+        self.bus = smbus2.SMBus(bus)
+        self.continuous = continuous
+        self._ready_at = None
+        self.is_connected = self._check_connection()
+        if self.is_connected and continuous:
+            self._start_continuous()
+    
+    def _check_connection(self):
+        """Verify sensor is connected"""
+        try:
+            self.bus.read_byte(self.i2c_address)
+            return True
+        except OSError:
+            return False
+    
+    def _start_continuous(self):
+        """Power on and start continuous high-res measurement"""
+        self.bus.write_byte(self.i2c_address, self.POWER_ON)
+        self.bus.write_byte(self.i2c_address, self.CONTINUOUS_HIGH_RES)
+        self._ready_at = time.monotonic() + self.MEASUREMENT_TIME
+    
+    def _read_result(self):
+        """Plain 2-byte read; no command byte, which would be interpreted as an opcode"""
+        msg = smbus2.i2c_msg.read(self.i2c_address, 2)
+        self.bus.i2c_rdwr(msg)
+        data = list(msg)
+        return (data[0] << 8 | data[1]) / 1.2
+    
+    def read(self):
+        """Read light intensity in lux"""
+        if not self.is_connected:
+            raise RuntimeError("BH1750 not connected")
+        
+        if not self.continuous:
+            self.bus.write_byte(self.i2c_address, self.ONE_TIME_HIGH_RES)
+            time.sleep(self.MEASUREMENT_TIME)  # Wait for measurement (180ms)
+            return round(self._read_result(), 2)
+        
+        if self._ready_at is None:
+            self._start_continuous()
+        # First result only exists one measurement time after starting
+        wait = self._ready_at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            lux = self._read_result()
+        except OSError:
+            # Sensor may have been power-cycled; restart continuous mode on the next read
+            self._ready_at = None
+            raise
+        return round(lux, 2)
+    
+    def status(self):
+        """Check sensor status"""
+        return {
+            "connected": self.is_connected,
+            "i2c_address": hex(self.i2c_address),
+            "mode": "continuous" if self.continuous else "one-time",
+            "type": "BH1750 Light Sensor"
+        }
+    
+    def power_down(self):
+        """Put sensor in power-down mode"""
+        if self.is_connected:
+            self.bus.write_byte(self.i2c_address, 0x00)
+            self._ready_at = None  # next continuous read powers it back up
+
+
+class DS18B20:
+    """Real implementation for DS18B20 temperature sensor
+    
+    For many sensors on one bus, use the triggered API: trigger_conversion()
+    starts a conversion on every sensor at once (w1-therm bulk read), and
+    collect() then reads each result in a few ms. read_all() does both.
+    
+    A periodic reader can call prefetch() after each read() so the next
+    conversion runs while it sleeps; that read() then only collects it.
+    """
+    
+    W1_BUS_MASTER = 'w1_bus_master1'
+    CONVERSION_TIME = 0.75  # 12-bit conversion time (s)
+    
+    def __init__(self, sensor_id=None):
+        os.system('modprobe w1-gpio')
+        os.system('modprobe w1-therm')
+        self.base_dir = '/sys/bus/w1/devices/'
+        self.device_folder = self._find_sensor(sensor_id)
+        self.is_connected = self.device_folder is not None
+        self._prefetched = False
+    
+    def _find_sensor(self, sensor_id):
+        """Find DS18B20 device folder"""
+        device_folders = glob.glob(self.base_dir + '28*')
+        if not device_folders:
+            return None
+        
+        if sensor_id:
+            # Look for specific sensor
+            target = self.base_dir + sensor_id
+            return target if target in device_folders else None
+        else:
+            # Use first available sensor
+            return device_folders[0]
+    
+    def _read_raw(self):
+        """Read raw sensor data"""
+        with open(self.device_folder + '/w1_slave', 'r') as f:
+            lines = f.readlines()
+        return lines
+    
+    @classmethod
+    def _bulk_read_path(cls, base_dir='/sys/bus/w1/devices/'):
+        return base_dir + cls.W1_BUS_MASTER + '/therm_bulk_read'
+    
+    @classmethod
+    def trigger_conversion(cls, base_dir='/sys/bus/w1/devices/'):
+        """Start a conversion on every DS18B20 on the bus in parallel.
+        Returns False when the kernel has no bulk read support (w1-therm before 5.10)."""
+        try:
+            with open(cls._bulk_read_path(base_dir), 'w') as f:
+                f.write('trigger\n')
+            return True
+        except OSError:
+            return False
+    
+    @classmethod
+    def conversion_pending(cls, base_dir='/sys/bus/w1/devices/'):
+        """True while a triggered conversion is still running"""
+        try:
+            with open(cls._bulk_read_path(base_dir), 'r') as f:
+                return f.read().strip() == '-1'
+        except OSError:
+            return False
+    
+    @classmethod
+    def wait_for_conversion(cls, timeout=1.0, base_dir='/sys/bus/w1/devices/'):
+        deadline = time.monotonic() + timeout
+        while cls.conversion_pending(base_dir) and time.monotonic() < deadline:
+            time.sleep(0.02)
+    
+    def collect(self):
+        """Read the result of the last triggered conversion in Celsius (does not start a new one)"""
+        if not self.is_connected:
+            raise RuntimeError("DS18B20 not connected")
+        
+        with open(self.device_folder + '/temperature', 'r') as f:
+            return round(int(f.read().strip()) / 1000.0, 2)
+    
+    @classmethod
+    def read_all(cls, sensors, timeout=1.0):
+        """Convert all sensors in one bus-wide conversion, then collect each.
+        Returns {device_folder: temperature or None}."""
+        base_dir = sensors[0].base_dir if sensors else '/sys/bus/w1/devices/'
+        if not cls.trigger_conversion(base_dir):
+            return {s.device_folder: cls._safe(s.read) for s in sensors}
+        cls.wait_for_conversion(timeout, base_dir)
+        return {s.device_folder: cls._safe(s.collect) for s in sensors}
+    
+    @staticmethod
+    def _safe(fn):
+        try:
+            return fn()
+        except (OSError, ValueError, RuntimeError):
+            return None
+    
+    def prefetch(self):
+        """Start the next bus-wide conversion now; the following read() collects it instead of converting again"""
+        self._prefetched = self.is_connected and self.trigger_conversion(self.base_dir)
+    
+    def read(self):
+        """Read temperature in Celsius"""
+        if not self.is_connected:
+            raise RuntimeError("DS18B20 not connected")
+        
+        if self._prefetched:
+            self._prefetched = False
+            self.wait_for_conversion(self.CONVERSION_TIME + 0.25, self.base_dir)
+            return self.collect()
+        
+        if self.trigger_conversion(self.base_dir):
+            self.wait_for_conversion(self.CONVERSION_TIME + 0.25, self.base_dir)
+            return self.collect()
+        
+        # Older kernels: reading w1_slave runs its own conversion
+        lines = self._read_raw()
+        while lines[0].strip()[-3:] != 'YES':
+            time.sleep(0.2)
+            lines = self._read_raw()
+        
+        equals_pos = lines[1].find('t=')
+        if equals_pos != -1:
+            temp_string = lines[1][equals_pos+2:]
+            temp_c = float(temp_string) / 1000.0
+            return round(temp_c, 2)
+        else:
+            raise RuntimeError("Invalid DS18B20 data")
+    
+    def status(self):
+        """Check sensor status"""
+        return {
+            "connected": self.is_connected,
+            "device_path": self.device_folder,
+            "type": "DS18B20 Temperature Sensor"
+        }
+
+
+class ACS712:
+    """Real implementation for ACS712 Hall Effect current sensor
+    
+    Single-shot mode (default) takes one ADS1115 sample per read(). With
+    start_sampling() the ADS1115 runs in continuous conversion (up to
+    860 SPS) and a background thread fills a NumPy ring buffer; read()
+    then returns the RMS (AC) or mean (DC) current over the last window
+    without touching the bus. The ADS1115 converts one channel at a time
+    in continuous mode, so only one ACS712 per ADC can sample this way.
+    """
+    
+    # Sensitivity values in mV/A for different models
+    SENSITIVITY = {
+        '05B': 185,  # ±5A
+        '20A': 100,  # ±20A
+        '30A': 66    # ±30A
+    }
+    
+    # ADS1115 full-scale voltage per gain setting
+    FULL_SCALE = {2/3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}
+    
+    # Absolute, so the saved zero offset does not depend on the service's working directory
+    CALIBRATION_FILE = os.getenv(
+        "ACS712_CALIBRATION_FILE",
+        os.path.join(os.path.expanduser(os.getenv("XDG_STATE_HOME", "~/.local/state")), "sih-rtu", "acs712_calibration.json"),
+    )
+    
+    def __init__(self, adc_channel=0, model='20A', adc_gain=1, calibration_file=None):
+        """
+        Initialize ACS712 sensor
+        :param adc_channel: ADC channel (0-3 for ADS1115)
+        :param model: '05B', '20A', or '30A'
+        :param adc_gain: ADC gain (1 = ±4.096V)
+        :param calibration_file: JSON file holding the zero-current voltage per channel
+        """
+        if model not in self.SENSITIVITY:
+            raise ValueError("Model must be '05B', '20A', or '30A'")
+        if Adafruit_ADS1x15 is None:
+            raise RuntimeError("ACS712 needs Adafruit-ADS1x15 and numpy")
+        
+        self.adc_channel = adc_channel
+        self.model = model
+        self.sensitivity = self.SENSITIVITY[model]
+        self.adc = Adafruit_ADS1x15.ADS1115()
+        self.adc_gain = adc_gain
+        self.volts_per_count = self.FULL_SCALE[adc_gain] / 32767.0
+        self.calibration_file = calibration_file or self.CALIBRATION_FILE
+        self.zero_voltage = self._load_zero()  # ACS712 outputs ~2.5V at 0A
+        self.is_connected = True  # ADC connection assumed
+        
+        self.mode = "rms"
+        self._ring = None
+        self._count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def _load_zero(self):
+        try:
+            with open(self.calibration_file, 'r') as f:
+                return float(json.load(f)[str(self.adc_channel)])
+        except (OSError, ValueError, KeyError):
+            return 2.5
+    
+    def _save_zero(self):
+        try:
+            with open(self.calibration_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data[str(self.adc_channel)] = round(self.zero_voltage, 5)
+        os.makedirs(os.path.dirname(os.path.abspath(self.calibration_file)), exist_ok=True)
+        tmp = self.calibration_file + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.calibration_file)
+    
+    def start_sampling(self, data_rate=860, window=0.5, mode="rms"):
+        """
+        Start continuous conversion and background sampling
+        :param data_rate: ADS1115 samples per second (8 - 860)
+        :param window: seconds of samples kept for read()
+        :param mode: "rms" for AC / chopped current, "mean" for steady DC
+        """
+        if self._thread is not None:
+            return
+        self.mode = mode
+        self.data_rate = data_rate
+        self._ring = np.zeros(max(1, int(data_rate * window)), dtype=np.int16)
+        self._count = 0
+        self._stop.clear()
+        self.adc.start_adc(self.adc_channel, gain=self.adc_gain, data_rate=data_rate)
+        self._thread = threading.Thread(target=self._sample_loop, name=f"acs712-ch{self.adc_channel}", daemon=True)
+        self._thread.start()
+    
+    def stop_sampling(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self._thread = None
+        self.adc.stop_adc()
+    
+    def _sample_loop(self):
+        period = 1.0 / self.data_rate
+        size = len(self._ring)
+        next_due = time.monotonic()
+        while not self._stop.is_set():
+            value = self.adc.get_last_result()
+            with self._lock:
+                self._ring[self._count % size] = value
+                self._count += 1
+            next_due += period
+            delay = next_due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_due = time.monotonic()  # fell behind; don't burst to catch up
+    
+    def _window_volts(self):
+        with self._lock:
+            n = min(self._count, len(self._ring))
+            counts = self._ring[:n].copy()
+        return counts.astype(np.float64) * self.volts_per_count
+    
+    def read_stats(self):
+        """Mean and RMS current (A) over the sampling window"""
+        if self._thread is None:
+            current = self.read()
+            return {"mean": current, "rms": abs(current), "samples": 1}
+        volts = self._window_volts()
+        if volts.size == 0:
+            raise RuntimeError("ACS712 sampling has no data yet")
+        amps = (volts - self.zero_voltage) * 1000 / self.sensitivity
+        return {
+            "mean": round(float(amps.mean()), 3),
+            "rms": round(float(np.sqrt(np.mean(amps * amps))), 3),
+            "samples": int(volts.size),
+        }
+    
+    def read(self):
+        """Read current in Amperes"""
+        if self._thread is not None:
+            return self.read_stats()[self.mode]
+        
+        # Read ADC value (16-bit signed)
+        adc_value = self.adc.read_adc(self.adc_channel, gain=self.adc_gain)
+        voltage = adc_value * self.volts_per_count
+        
+        # Calculate current relative to the calibrated zero-current voltage
+        current = (voltage - self.zero_voltage) * 1000 / self.sensitivity
+        return round(current, 3)
+    
+    def status(self):
+        """Check sensor status"""
+        return {
+            "connected": self.is_connected,
+            "adc_channel": self.adc_channel,
+            "model": self.model,
+            "sensitivity_mV_per_A": self.sensitivity,
+            "zero_voltage": round(self.zero_voltage, 4),
+            "sampling": self._thread is not None,
+            "type": "ACS712 Current Sensor"
+        }
+    
+    def calibrate_zero(self, samples=100, save=True):
+        """Calibrate zero-point voltage (for no-load condition) and persist it for this channel"""
+        if self._thread is not None:
+            # Use the ring buffer: one window of samples is already there
+            deadline = time.monotonic() + 2.0
+            while self._count < min(samples, len(self._ring)) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.zero_voltage = float(self._window_volts().mean())
+        else:
+            total = 0
+            for _ in range(samples):
+                total += self.adc.read_adc(self.adc_channel, gain=self.adc_gain, data_rate=860)
+            self.zero_voltage = (total / samples) * self.volts_per_count
+        if save:
+            self._save_zero()
+        print(f"Calibrated zero voltage: {self.zero_voltage:.3f}V")
+
+
+# # Example usage
+# if __name__ == "__main__":
+#     try:
+#         # Initialize sensors
+#         print("Initializing sensors...")
+#         light_sensor = BH1750()
+#         temp_sensor = DS18B20()
+#         current_sensor = ACS712(model='20A')  # Using ±20A model
+        
+#         # Read all sensors
+#         print("\n=== Sensor Readings ===")
+#         print(f"Light: {light_sensor.read()} lux")
+#         print(f"Temperature: {temp_sensor.read()} °C")
+#         print(f"Current: {current_sensor.read()} A")
+        
+#         print("\n=== Sensor Status ===")
+#         print("BH1750:", light_sensor.status())
+#         print("DS18B20:", temp_sensor.status())
+#         print("ACS712:", current_sensor.status())
+        
+#         # Optional: Calibrate current sensor (do this with no load)
+#         # current_sensor.calibrate_zero()
+        
+#     except Exception as e:
+#         print(f"Error: {e}")
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""
+Versioned compact wire schema for RTU telemetry over MQTT.
+
+Legacy payloads are pretty-keyed JSON objects published to
+``solar/rtu/<node_id>``. Compact payloads are published to
+``solar/rtu/<node_id>/<suffix>``, where the suffix names the encoding
+and schema version:
+
+    c1  JSON with short keys       (no extra dependency)
+    m1  MessagePack, short keys    (pip install msgpack)
+    b1  CBOR, short keys           (pip install cbor2)
+
+A v1 compact object holds "v": 1 and "t": epoch seconds, plus short-keyed
+fields (FIELD_KEYS). Unknown keys pass through unchanged. Null fields are
+omitted. "n" (node_id) is omitted when it equals the topic's node
+segment, and "m" (measurement) is omitted when it is DEFAULT_MEASUREMENT.
+decode_message() turns any of these back into the legacy flat payload
+{"measurement", "node_id", "timestamp", <fields>...}.
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+SCHEMA_VERSION = 1
+DEFAULT_MEASUREMENT = "solar_rtu"
+
+# Long field name -> short wire key. Append only; never reuse a short key.
+FIELD_KEYS: Dict[str, str] = {
+    "DC_POWER": "dp",
+    "AC_POWER": "ap",
+    "AMBIENT_TEMPERATURE": "at",
+    "MODULE_TEMPERATURE": "mt",
+    "IRRADIATION": "ir",
+    "PR": "pr",
+    "TEMP_DELTA": "td",
+    "DC_AC_RATIO": "dr",
+    "PR_ROLL_MEAN": "rm",
+    "PR_ROLL_STD": "rs",
+    "PR_SLOPE": "sl",
+    "PR_DEV": "pd",
+    "TEMP_DELTA_SIGMA": "ts",
+    "img_panel_score": "ip",
+    "img_dusty_score": "id",
+    "img_cracked_score": "ic",
+    "img_bird_drop_score": "ib",
+    "lux": "lx",
+    "temperature_sensor_c": "tc",
+    "voltage": "vo",
+}
+LONG_KEYS: Dict[str, str] = {short: long for long, short in FIELD_KEYS.items()}
+
+# Reserved header keys of a compact object
+_HEADER_KEYS = {"v", "t", "n", "m"}
+_HEADER_SOURCES = {"measurement", "node_id", "timestamp"}
+
+# Topic suffix -> encoding
+SUFFIX_FORMATS: Dict[str, str] = {"c1": "compact", "m1": "msgpack", "b1": "cbor"}
+FORMAT_SUFFIXES: Dict[str, str] = {fmt: suffix for suffix, fmt in SUFFIX_FORMATS.items()}
+PAYLOAD_FORMATS = ("json",) + tuple(FORMAT_SUFFIXES)
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError as exc:
+        raise RuntimeError("MessagePack payloads need the 'msgpack' package") from exc
+    return msgpack
+
+
+def _cbor():
+    try:
+        import cbor2
+    except ImportError as exc:
+        raise RuntimeError("CBOR payloads need the 'cbor2' package") from exc
+    return cbor2
+
+
+def _epoch(value: object) -> object:
+    """Epoch seconds for the compact "t" key (ints stay ints; ISO strings are parsed)."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value // 1_000_000_000 if isinstance(value, int) and value > 1_000_000_000_000 else value
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+        if parsed.tzinfo is None:
+            # Naive ISO times are UTC, as in the bridge's to_ns, not host-local time
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        seconds = parsed.timestamp()
+        return int(seconds) if seconds.is_integer() else seconds
+    return value
+
+
+def compact(payload: Dict[str, object], topic_node: Optional[str] = None) -> Dict[str, object]:
+    """Legacy flat payload -> v1 compact object."""
+    out: Dict[str, object] = {"v": SCHEMA_VERSION}
+    if payload.get("timestamp") is not None:
+        out["t"] = _epoch(payload["timestamp"])
+    node = payload.get("node_id")
+    if node is not None and str(node) != topic_node:
+        out["n"] = node
+    measurement = payload.get("measurement")
+    if measurement and measurement != DEFAULT_MEASUREMENT:
+        out["m"] = measurement
+    for key, value in payload.items():
+        if key in _HEADER_SOURCES or value is None:
+            continue
+        short = FIELD_KEYS.get(key, key)
+        if short in _HEADER_KEYS:
+            raise ValueError(f"field '{key}' collides with a compact header key")
+        out[short] = value
+    return out
+
+
+def expand(obj: Dict[str, object], topic_node: Optional[str] = None) -> Dict[str, object]:
+    """v1 compact object -> legacy flat payload."""
+    version = obj.get("v")
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"unsupported telemetry schema version {version!r}")
+    payload: Dict[str, object] = {
+        "measurement": obj.get("m") or DEFAULT_MEASUREMENT,
+        "node_id": obj.get("n", topic_node),
+        "timestamp": obj.get("t"),
+    }
+    for key, value in obj.items():
+        if key in _HEADER_KEYS:
+            continue
+        payload[LONG_KEYS.get(key, key)] = value
+    return payload
+
+
+def encode_payload(payload: Dict[str, object], fmt: str, topic_node: Optional[str] = None) -> bytes:
+    """Serialize a legacy flat payload in the given format ("json" keeps the legacy schema)."""
+    if fmt == "json":
+        return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    obj = compact(payload, topic_node)
+    if fmt == "compact":
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    if fmt == "msgpack":
+        return _msgpack().packb(obj, use_bin_type=True)
+    if fmt == "cbor":
+        return _cbor().dumps(obj)
+    raise ValueError(f"unknown payload format '{fmt}' (expected one of {PAYLOAD_FORMATS})")
+
+
+def publish_topic(base_topic: str, fmt: str) -> str:
+    """Topic to publish a payload of this format on (legacy JSON keeps the base topic)."""
+    if fmt == "json":
+        return base_topic
+    if fmt not in FORMAT_SUFFIXES:
+        raise ValueError(f"unknown payload format '{fmt}' (expected one of {PAYLOAD_FORMATS})")
+    return f"{base_topic.rstrip('/')}/{FORMAT_SUFFIXES[fmt]}"
+
+
+def split_topic(topic: str) -> Tuple[str, Optional[str]]:
+    """(base topic, format) where format is None for legacy JSON topics."""
+    head, _, last = topic.rpartition("/")
+    if head and last in SUFFIX_FORMATS:
+        return head, SUFFIX_FORMATS[last]
+    return topic, None
+
+
+def decode_message(topic: str, raw: bytes) -> Dict[str, object]:
+    """Decode an MQTT telemetry message of any supported format into a legacy flat payload."""
+    base, fmt = split_topic(topic)
+    topic_node = base.rpartition("/")[2] or None
+
+    if fmt is None:
+        payload = json.loads(raw)
+        if not isinstance(payload, dict):
+            raise ValueError("payload is not a JSON object")
+        return payload
+    if fmt == "compact":
+        obj = json.loads(raw)
+    elif fmt == "msgpack":
+        obj = _msgpack().unpackb(raw, raw=False)
+    else:
+        obj = _cbor().loads(raw)
+    if not isinstance(obj, dict):
+        raise ValueError("compact payload is not an object")
+    return expand(obj, topic_node)
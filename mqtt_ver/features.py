@@ -0,0 +1,156 @@
+import math
+
+# ===================== Incremental Feature Engine =====================
+# Online version of engineer_features() in
+# RTU-MODEL/Notebooks and Scripts/anomaly_injection.py, computed on the RTU
+# in O(1) per sample:
+#   PR, TEMP_DELTA, DC_AC_RATIO      - per-sample ratios / differences
+#   PR_ROLL_MEAN, PR_ROLL_STD        - rolling(8, min_periods=3) mean / sample std
+#   PR_SLOPE                         - rolling least-squares slope over x = 0..n-1
+#   PR_DEV                           - deviation from the running PR baseline mean
+#   TEMP_DELTA_SIGMA                 - TEMP_DELTA in sigmas of its running mean/std
+# The offline baselines use the full history; here they are expanding means
+# since start-up, the closest online equivalent.
+
+ROLLING_WINDOW = 8
+ROLLING_MIN_PERIODS = 3
+RESYNC_EVERY = 1000  # recompute window sums from the ring to cancel float drift
+
+
+def _ratio(num, den):
+    if num is None or den is None or den == 0:
+        return None
+    value = num / den
+    return value if math.isfinite(value) else None
+
+
+class RollingWindow:
+    """Fixed-size ring with running sums for mean, sample std and LS slope."""
+
+    def __init__(self, window=ROLLING_WINDOW, min_periods=ROLLING_MIN_PERIODS):
+        self.window = window
+        self.min_periods = min_periods
+        self._ring = [0.0] * window
+        self._valid = [False] * window
+        self._start = 0   # ring index of the oldest element
+        self._n = 0       # elements in the window (valid or missing)
+        self._count = 0   # valid elements
+        self._sum = 0.0   # sum of valid y
+        self._sumsq = 0.0
+        self._sxy = 0.0   # sum of i * y over window positions i = 0..n-1 (missing y counts as 0)
+        self._pushes = 0
+
+    def push(self, y):
+        """Add a sample (None/NaN counts as missing, like NaN in pandas rolling)."""
+        valid = y is not None and math.isfinite(y)
+        y = float(y) if valid else 0.0
+
+        if self._n == self.window:
+            # Drop the oldest element; every remaining position shifts down by one
+            old = self._ring[self._start]
+            self._sxy -= self._sum - old
+            if self._valid[self._start]:
+                self._count -= 1
+                self._sum -= old
+                self._sumsq -= old * old
+            self._start = (self._start + 1) % self.window
+            self._n -= 1
+
+        slot = (self._start + self._n) % self.window
+        self._ring[slot] = y
+        self._valid[slot] = valid
+        self._sxy += self._n * y
+        self._n += 1
+        if valid:
+            self._count += 1
+            self._sum += y
+            self._sumsq += y * y
+
+        self._pushes += 1
+        if self._pushes % RESYNC_EVERY == 0:
+            self._resync()
+
+    def _resync(self):
+        ys = [self._ring[(self._start + i) % self.window] for i in range(self._n)]
+        self._sum = sum(ys)
+        self._sumsq = sum(y * y for y in ys)
+        self._sxy = sum(i * y for i, y in enumerate(ys))
+
+    def mean(self):
+        if self._count < self.min_periods:
+            return None
+        return self._sum / self._count
+
+    def std(self):
+        if self._count < self.min_periods or self._count < 2:
+            return None
+        var = (self._sumsq - self._sum * self._sum / self._count) / (self._count - 1)
+        return math.sqrt(max(var, 0.0))
+
+    def slope(self):
+        """polyfit(range(n), y, 1)[0]; None if too few samples or any missing in the window."""
+        n = self._n
+        if self._count < self.min_periods or self._count != n or n < 2:
+            return None
+        sx = n * (n - 1) / 2.0
+        sxx = (n - 1) * n * (2 * n - 1) / 6.0
+        return (n * self._sxy - sx * self._sum) / (n * sxx - sx * sx)
+
+
+class RunningStats:
+    """Expanding mean and sample std (Welford)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def push(self, x):
+        if x is None or not math.isfinite(x):
+            return
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    def std(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count >= 2 else None
+
+
+class FeatureEngine:
+    def __init__(self, window=ROLLING_WINDOW, min_periods=ROLLING_MIN_PERIODS):
+        self.pr_window = RollingWindow(window, min_periods)
+        self.pr_baseline = RunningStats()
+        self.temp_delta_stats = RunningStats()
+
+    def update(self, dc_power, ac_power, irradiation, module_temp, ambient_temp):
+        """Push one sample and return the model features (None where undefined)."""
+        pr = _ratio(ac_power, irradiation)
+        dc_ac = _ratio(dc_power, ac_power)
+        temp_delta = None
+        if module_temp is not None and ambient_temp is not None:
+            temp_delta = module_temp - ambient_temp
+
+        self.pr_window.push(pr)
+        self.pr_baseline.push(pr)
+        self.temp_delta_stats.push(temp_delta)
+
+        pr_dev = None
+        if pr is not None and self.pr_baseline.count:
+            pr_dev = _ratio(self.pr_baseline.mean - pr, self.pr_baseline.mean)
+
+        td_sigma = None
+        td_std = self.temp_delta_stats.std()
+        if temp_delta is not None and td_std:
+            td_sigma = (temp_delta - self.temp_delta_stats.mean) / td_std
+
+        return {
+            "PR": pr,
+            "TEMP_DELTA": temp_delta,
+            "DC_AC_RATIO": dc_ac,
+            "PR_ROLL_MEAN": self.pr_window.mean(),
+            "PR_ROLL_STD": self.pr_window.std(),
+            "PR_SLOPE": self.pr_window.slope(),
+            "PR_DEV": pr_dev,
+            "TEMP_DELTA_SIGMA": td_sigma,
+        }
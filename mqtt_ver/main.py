@@ -3,8 +3,14 @@ import json
 import uuid
 import random
 import os
+from collections import deque
 import paho.mqtt.client as mqtt
 from sensor_classes import BH1750, DS18B20, ESP32Voltage
+from sampler import Sampler
+from features import FeatureEngine
+from spool import Spool
+# Wire schema shared with the fog bridge (pip install ../common)
+from telemetry_schema import encode_payload, publish_topic
 
 # ===================== Configuration =====================
 # Read from environment variables with sensible defaults
@@ -12,11 +18,25 @@ MQTT_BROKER = os.getenv("MQTT_BROKER", "10.0.40.101")
 MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
 PUBLISH_INTERVAL = int(os.getenv("PUBLISH_INTERVAL", "5"))  # seconds
 MEASUREMENT = os.getenv("MEASUREMENT", "solar_rtu")
+SPOOL_DRAIN_RATE = float(os.getenv("SPOOL_DRAIN_RATE", "10"))  # spooled messages replayed per second
+SPOOL_MAX_INFLIGHT = int(os.getenv("SPOOL_MAX_INFLIGHT", "20"))  # replayed messages awaiting broker ack
+SPOOL_ACK_TIMEOUT = float(os.getenv("SPOOL_ACK_TIMEOUT", "30"))  # seconds without acks before replays are resent
+SPOOL_REPLAY_TICK = float(os.getenv("SPOOL_REPLAY_TICK", "0.2"))  # seconds between replay passes
+# json (legacy topic) | compact | msgpack | cbor (published on MQTT_TOPIC/<c1|m1|b1>)
+PAYLOAD_FORMAT = os.getenv("PAYLOAD_FORMAT", "json")
+
+# Per-sensor sampling (interval seconds, timeout seconds); each runs on its own thread
+SENSOR_SCHEDULE = {
+    'bh1750': (float(os.getenv("BH1750_INTERVAL", "1")), 1.0),
+    'ds18b20': (float(os.getenv("DS18B20_INTERVAL", "2")), 2.0),
+    'esp32': (float(os.getenv("ESP32_INTERVAL", "0.5")), 3.0),
+}
 
 # Generate UUID-based device identifier
 DEVICE_UUID = str(uuid.uuid4())
 NODE_ID = DEVICE_UUID
 MQTT_TOPIC = os.getenv("MQTT_TOPIC", f"solar/rtu/{DEVICE_UUID}")
+PUBLISH_TOPIC = publish_topic(MQTT_TOPIC, PAYLOAD_FORMAT)
 
 # ===================== Sensor Initialization =====================
 def initialize_sensors():
@@ -49,7 +69,7 @@ def initialize_sensors():
     return sensors
 
 # ===================== MQTT Setup =====================
-def setup_mqtt():
+def setup_mqtt(acked_mids):
     client = mqtt.Client(client_id=NODE_ID)
     
     def on_connect(client, userdata, flags, rc):
@@ -59,7 +79,9 @@ def setup_mqtt():
             print(f"[ERROR] MQTT connection failed with code {rc}")
     
     def on_publish(client, userdata, mid):
-        print(f"[OK] Message published to {MQTT_TOPIC}")
+        # Runs on paho's network thread; the spool replayer matches the id on the main loop
+        acked_mids.append(mid)
+        print(f"[OK] Message published to {PUBLISH_TOPIC}")
     
     def on_disconnect(client, userdata, rc):
         if rc != 0:
@@ -70,7 +92,9 @@ def setup_mqtt():
     client.on_disconnect = on_disconnect
     
     try:
-        client.connect(MQTT_BROKER, MQTT_PORT, keepalive=60)
+        # Connect in the background so an unreachable broker at boot only spools data; paho keeps retrying
+        client.reconnect_delay_set(min_delay=1, max_delay=60)
+        client.connect_async(MQTT_BROKER, MQTT_PORT, keepalive=60)
         client.loop_start()
         return client
     except Exception as e:
@@ -78,37 +102,36 @@ def setup_mqtt():
         return None
 
 # ===================== Generate Telemetry Data =====================
-def generate_telemetry(sensors):
-    """Generate comprehensive telemetry data with all required fields"""
+def _round(value, digits):
+    return None if value is None else round(value, digits)
+
+def generate_telemetry(readings, engine):
+    """Generate comprehensive telemetry data with all required fields.
+
+    readings is the sampler's latest-value cache ({name: value or None});
+    building the payload never touches sensor hardware. Model features
+    come from the incremental FeatureEngine (see features.py).
+    """
     
     timestamp = int(time.time())
     
-    # Read actual sensor values
-    voltage = None
-    temperature_c = None
-    lux = None
-    
-    if sensors['esp32']:
-        try:
-            voltage = sensors['esp32'].read()
-        except Exception as e:
-            print(f"[ERROR] ESP32 read failed: {e}")
-    
-    if sensors['ds18b20']:
-        try:
-            temperature_c = sensors['ds18b20'].read()
-        except Exception as e:
-            print(f"[ERROR] DS18B20 read failed: {e}")
-    
-    if sensors['bh1750']:
-        try:
-            lux = sensors['bh1750'].read()
-        except Exception as e:
-            print(f"[ERROR] BH1750 read failed: {e}")
+    # Latest sensor values (None when missing, failed or stale)
+    voltage = readings.get('esp32')
+    temperature_c = readings.get('ds18b20')
+    lux = readings.get('bh1750')
     
     # Calculate DC_POWER from voltage (voltage × 0.56 mA)
     dc_power = round(voltage * 0.56, 3) if voltage else round(random.uniform(0, 500), 3)
     
+    # No sensors for these yet: placeholder values
+    ac_power = round(random.uniform(0, 450), 3)
+    ambient = temperature_c if temperature_c else round(random.uniform(15, 45), 2)
+    module_temp = round(random.uniform(20, 60), 2)
+    irradiation = round(random.uniform(0, 1000), 2)
+    
+    # Model features, updated in O(1) from this sample (rolling window 8, min_periods 3)
+    f = engine.update(dc_power, ac_power, irradiation, module_temp, ambient)
+    
     # Build telemetry payload with all required fields
     # InfluxDB Line Protocol compatible JSON
     data = {
@@ -118,24 +141,24 @@ def generate_telemetry(sensors):
         
         # Power metrics
         "DC_POWER": dc_power,
-        "AC_POWER": round(random.uniform(0, 450), 3),
+        "AC_POWER": ac_power,
         
         # Temperature metrics
-        "AMBIENT_TEMPERATURE": temperature_c if temperature_c else round(random.uniform(15, 45), 2),
-        "MODULE_TEMPERATURE": round(random.uniform(20, 60), 2),
+        "AMBIENT_TEMPERATURE": ambient,
+        "MODULE_TEMPERATURE": module_temp,
         
         # Irradiation
-        "IRRADIATION": round(random.uniform(0, 1000), 2),
+        "IRRADIATION": irradiation,
         
-        # Performance metrics
-        "PR": round(random.uniform(0.7, 0.95), 3),
-        "TEMP_DELTA": round(random.uniform(5, 20), 2),
-        "DC_AC_RATIO": round(random.uniform(0.9, 1.0), 3),
-        "PR_ROLL_MEAN": round(random.uniform(0.75, 0.92), 3),
-        "PR_ROLL_STD": round(random.uniform(0.01, 0.05), 3),
-        "PR_SLOPE": round(random.uniform(-0.02, 0.02), 4),
-        "PR_DEV": round(random.uniform(0.01, 0.10), 3),
-        "TEMP_DELTA_SIGMA": round(random.uniform(2, 8), 2),
+        # Performance metrics (None until the window has min_periods samples)
+        "PR": _round(f["PR"], 3),
+        "TEMP_DELTA": _round(f["TEMP_DELTA"], 2),
+        "DC_AC_RATIO": _round(f["DC_AC_RATIO"], 3),
+        "PR_ROLL_MEAN": _round(f["PR_ROLL_MEAN"], 3),
+        "PR_ROLL_STD": _round(f["PR_ROLL_STD"], 3),
+        "PR_SLOPE": _round(f["PR_SLOPE"], 4),
+        "PR_DEV": _round(f["PR_DEV"], 3),
+        "TEMP_DELTA_SIGMA": _round(f["TEMP_DELTA_SIGMA"], 2),
         
         # Image analysis scores (0-100)
         "img_panel_score": round(random.uniform(70, 100), 2),
@@ -151,6 +174,71 @@ def generate_telemetry(sensors):
     
     return data
 
+# ===================== Store and Forward =====================
+def publish_or_spool(client, spool, topic, payload):
+    """Publish live when connected; otherwise keep the payload in the on-disk spool."""
+    if client.is_connected():
+        info = client.publish(topic, payload, qos=1)
+        if info.rc == mqtt.MQTT_ERR_SUCCESS:
+            return True
+        print(f"[WARN] Publish failed (rc={info.rc}), spooling")
+    spool.append(topic, payload)
+    return False
+
+class SpoolReplayer:
+    """Replays the spool at SPOOL_DRAIN_RATE without waiting on the broker.
+
+    The main loop calls replay() every SPOOL_REPLAY_TICK seconds, between
+    publishes. Up to SPOOL_MAX_INFLIGHT replayed messages are unacknowledged
+    at once. on_publish queues acked message ids in acked_mids; replay()
+    matches them to spool rows and deletes those rows together, which frees
+    the window for the same pass. If no ack arrives for SPOOL_ACK_TIMEOUT
+    seconds the unacked rows are handed out again.
+    """
+
+    def __init__(self, client, spool, acked_mids):
+        self.client = client
+        self.spool = spool
+        self.acked_mids = acked_mids
+        self.inflight = {}  # MQTT message id -> spool row id
+        self.last_progress = time.monotonic()
+
+    def replay(self):
+        now = time.monotonic()
+        acked = []
+        while self.acked_mids:
+            row_id = self.inflight.pop(self.acked_mids.popleft(), None)
+            if row_id is not None:
+                acked.append(row_id)
+        if acked:
+            self.spool.ack(acked)
+            self.last_progress = now
+            print(f"[OK] Replayed {len(acked)} spooled messages, {self.spool.pending()} left")
+
+        if not self.client.is_connected():
+            # paho resends unacked messages itself after reconnecting; the timeout only runs while connected
+            self.last_progress = now
+            return len(acked)
+        if self.inflight and now - self.last_progress > SPOOL_ACK_TIMEOUT:
+            print(f"[WARN] {len(self.inflight)} replayed messages unacknowledged for {SPOOL_ACK_TIMEOUT:.0f}s, resending")
+            self.inflight.clear()
+            self.spool.release()
+        if not self.inflight:
+            self.last_progress = now
+
+        rows = self.spool.take(
+            rate=SPOOL_DRAIN_RATE,
+            burst=max(1, int(SPOOL_DRAIN_RATE * SPOOL_REPLAY_TICK) + 1),
+            limit=SPOOL_MAX_INFLIGHT - len(self.inflight),
+        )
+        for n, (row_id, topic, payload) in enumerate(rows):
+            info = self.client.publish(topic, payload, qos=1)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                self.spool.release([r[0] for r in rows[n:]])
+                break
+            self.inflight[info.mid] = row_id
+        return len(acked)
+
 # ===================== Main Loop =====================
 def main():
     print("=" * 70)
@@ -161,39 +249,67 @@ def main():
     print(f"[INFO] MQTT Broker: {MQTT_BROKER}:{MQTT_PORT}")
     print(f"[INFO] MQTT Topic: {MQTT_TOPIC}")
     print(f"[INFO] Measurement: {MEASUREMENT}")
+    print(f"[INFO] Payload format: {PAYLOAD_FORMAT}")
     
-    # Initialize sensors
+    # Initialize sensors and sample each one in the background
     sensors = initialize_sensors()
+    sampler = Sampler()
+    for name, (interval, timeout) in SENSOR_SCHEDULE.items():
+        sampler.add(name, sensors[name], interval, timeout)
+    sampler.start()
+    engine = FeatureEngine()
     
     # Setup MQTT
-    mqtt_client = setup_mqtt()
+    acked_mids = deque()
+    mqtt_client = setup_mqtt(acked_mids)
     if not mqtt_client:
         print("[FATAL] Cannot start without MQTT connection")
         return
     
-    print(f"\n[INFO] Publishing to {MQTT_TOPIC} every {PUBLISH_INTERVAL} seconds")
+    spool = Spool()
+    if spool.pending():
+        print(f"[INFO] {spool.pending()} spooled messages waiting for replay")
+    replayer = SpoolReplayer(mqtt_client, spool, acked_mids)
+
+    print(f"\n[INFO] Publishing to {PUBLISH_TOPIC} every {PUBLISH_INTERVAL} seconds")
     print("[INFO] Press Ctrl+C to stop\n")
     
+    # node_id can be left out of compact payloads when the topic already ends with it
+    topic_node = NODE_ID if MQTT_TOPIC.rstrip("/").rsplit("/", 1)[-1] == NODE_ID else None
+    
+    next_publish = time.monotonic()
     try:
         while True:
-            # Generate and publish telemetry
-            payload_dict = generate_telemetry(sensors)
-            payload = json.dumps(payload_dict)
+            if time.monotonic() >= next_publish:
+                # Generate and publish telemetry
+                payload_dict = generate_telemetry(sampler.values(), engine)
+                payload = encode_payload(payload_dict, PAYLOAD_FORMAT, topic_node=topic_node)
+                
+                # Publish to MQTT, spooling to disk while the broker is unreachable
+                try:
+                    if publish_or_spool(mqtt_client, spool, PUBLISH_TOPIC, payload):
+                        print(f"[OK] Payload sent ({len(payload)} bytes): {json.dumps(payload_dict)[:80]}...")
+                    else:
+                        print(f"[WARN] Broker unavailable, payload spooled ({spool.pending()} pending)")
+                except Exception as e:
+                    print(f"[ERROR] Failed to publish: {e}")
+                next_publish = max(next_publish + PUBLISH_INTERVAL, time.monotonic())
             
-            # Publish to MQTT
+            # Replay the spool on its own short tick until the next publish is due
             try:
-                mqtt_client.publish(MQTT_TOPIC, payload, qos=1)
-                print(f"[OK] Payload sent: {payload[:80]}...")
+                replayer.replay()
             except Exception as e:
-                print(f"[ERROR] Failed to publish: {e}")
-            
-            # Wait for next interval
-            time.sleep(PUBLISH_INTERVAL)
+                print(f"[ERROR] Spool replay failed: {e}")
+            time.sleep(max(0.0, min(SPOOL_REPLAY_TICK, next_publish - time.monotonic())))
     
     except KeyboardInterrupt:
         print("\n[INFO] Shutting down...")
+        sampler.stop()
+        if sensors['esp32']:
+            sensors['esp32'].close()
         mqtt_client.loop_stop()
         mqtt_client.disconnect()
+        spool.close()
         print("[OK] Disconnected from MQTT broker")
 
 if __name__ == "__main__":
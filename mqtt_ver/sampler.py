@@ -0,0 +1,113 @@
+import threading
+import time
+
+# ===================== Background Sensor Sampling =====================
+# Each sensor is read on its own daemon thread at its own interval and the
+# latest value is cached. The publish loop only takes snapshot(), which
+# never touches hardware, so a slow or hung sensor cannot delay it.
+# Sensors with a prefetch() (DS18B20) start their next conversion right
+# after each read, so it runs during the wait instead of inside read().
+
+
+class SensorWorker:
+    def __init__(self, name, sensor, interval, timeout):
+        self.name = name
+        self.sensor = sensor
+        self.interval = interval
+        self.timeout = timeout
+
+        self.value = None
+        self.updated = None  # monotonic time of the last good read
+        self.error = None
+        self.reads = 0
+        self.failures = 0
+        self._read_started = None
+        self._prefetch = getattr(sensor, "prefetch", None)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"sensor-{name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        next_due = time.monotonic()
+        while not self._stop.is_set():
+            self._read_started = time.monotonic()
+            try:
+                value = self.sensor.read()
+                with self._lock:
+                    self.value = value
+                    self.updated = time.monotonic()
+                    self.error = None
+                    self.reads += 1
+            except Exception as e:
+                with self._lock:
+                    if self.error is None:
+                        print(f"[ERROR] {self.name} read failed: {e}")
+                    self.error = str(e)
+                    self.failures += 1
+            self._read_started = None
+            if self._prefetch is not None:
+                try:
+                    self._prefetch()
+                except Exception as e:
+                    print(f"[WARN] {self.name} prefetch failed: {e}")
+
+            next_due += self.interval
+            now = time.monotonic()
+            if next_due < now:  # read overran its slot; don't try to catch up
+                next_due = now
+            self._stop.wait(next_due - now)
+
+    def snapshot(self, now=None):
+        """Latest value with its age and status; value is None once older than timeout."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            age = None if self.updated is None else now - self.updated
+            started = self._read_started
+            if started is not None and now - started > self.timeout:
+                status = "timeout"
+            elif self.error is not None:
+                status = "error"
+            elif age is None:
+                status = "pending"
+            else:
+                status = "ok"
+            stale = age is None or age > self.interval + self.timeout
+            return {
+                "value": None if stale else self.value,
+                "age": None if age is None else round(age, 3),
+                "status": "stale" if stale and status == "ok" else status,
+            }
+
+
+class Sampler:
+    def __init__(self):
+        self.workers = {}
+
+    def add(self, name, sensor, interval, timeout):
+        """Sample sensor.read() every interval seconds; values older than interval + timeout expire."""
+        if sensor is None:
+            return
+        self.workers[name] = SensorWorker(name, sensor, interval, timeout)
+
+    def start(self):
+        for worker in self.workers.values():
+            worker.start()
+
+    def stop(self):
+        for worker in self.workers.values():
+            worker.stop()
+
+    def snapshot(self):
+        now = time.monotonic()
+        return {name: worker.snapshot(now) for name, worker in self.workers.items()}
+
+    def values(self):
+        """{name: latest fresh value or None}; sensors that were never added are absent."""
+        return {name: reading["value"] for name, reading in self.snapshot().items()}
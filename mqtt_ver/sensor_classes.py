@@ -1,93 +1,32 @@
-import smbus2
 import time
-import os
-import glob
+import threading
+from collections import deque
 import serial
+# BH1750 and DS18B20 drivers are shared with the LoRa RTU (pip install ../common)
+from rtu_sensors import BH1750, DS18B20
 
-# ===================== BH1750 =====================
-class BH1750:
-    def __init__(self, i2c_address=0x23, bus=1):
-        self.addr = i2c_address
-        self.bus = smbus2.SMBus(bus)
-        self.connected = self._check()
-
-    def _check(self):
-        try:
-            self.bus.read_byte(self.addr)
-            return True
-        except:
-            return False
-
-    def read(self):
-        if not self.connected:
-            raise RuntimeError("BH1750 not connected")
-
-        self.bus.write_byte(self.addr, 0x10)
-        time.sleep(0.18)
-
-        data = self.bus.read_i2c_block_data(self.addr, 0x00, 2)
-        lux = (data[0] << 8 | data[1]) / 1.2
-        return round(lux, 2)
-
-    def status(self):
-        return {
-            "connected": self.connected,
-            "i2c_address": hex(self.addr),
-            "type": "BH1750 Light Sensor"
-        }
-
-
-# ===================== DS18B20 =====================
-class DS18B20:
-    def __init__(self, sensor_id=None):
-        os.system('modprobe w1-gpio')
-        os.system('modprobe w1-therm')
-
-        self.base_dir = '/sys/bus/w1/devices/'
-        self.device = self._find(sensor_id)
-        self.connected = self.device is not None
-
-    def _find(self, sensor_id):
-        devices = glob.glob(self.base_dir + '28*')
-        if not devices:
-            return None
-        if sensor_id:
-            target = self.base_dir + sensor_id
-            return target if target in devices else None
-        return devices[0]
-
-    def _read_raw(self):
-        with open(self.device + '/w1_slave', 'r') as f:
-            return f.readlines()
-
-    def read(self):
-        if not self.connected:
-            raise RuntimeError("DS18B20 not connected")
-
-        lines = self._read_raw()
-        while lines[0].strip()[-3:] != 'YES':
-            time.sleep(0.2)
-            lines = self._read_raw()
-
-        temp_pos = lines[1].find('t=')
-        temp_c = float(lines[1][temp_pos+2:]) / 1000.0
-        return round(temp_c, 2)
-
-    def status(self):
-        return {
-            "connected": self.connected,
-            "device": self.device,
-            "type": "DS18B20 Temperature Sensor"
-        }
-
+__all__ = ["BH1750", "DS18B20", "ESP32Voltage"]
 
 # ===================== ESP32 Voltage =====================
 class ESP32Voltage:
-    def __init__(self, port='/dev/ttyUSB0', baud=115200):
+    # A reader thread drains the serial port continuously and keeps the newest
+    # value plus a timestamped ring, so read() returns immediately and never
+    # serves a stale line from the OS buffer.
+    def __init__(self, port='/dev/ttyUSB0', baud=115200, max_age=3.0, history=256):
         self.port = port
         self.baud = baud
+        self.max_age = max_age
         self.ser = None
+        self.lines_ok = 0
+        self.lines_bad = 0
+        self._latest = None  # (monotonic time, unix time, value)
+        self._ring = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
         self.connected = self._connect()
+        self._thread = threading.Thread(target=self._reader, name="esp32-serial", daemon=True)
+        if self.connected:
+            self._thread.start()
 
     def _connect(self):
         try:
@@ -98,26 +37,77 @@ class ESP32Voltage:
         except:
             return False
 
+    def _reader(self):
+        while not self._stop.is_set():
+            try:
+                raw = self.ser.readline()
+            except Exception as e:
+                print(f"[WARN] ESP32 serial error: {e}; reconnecting")
+                try:
+                    self.ser.close()
+                except Exception:
+                    pass
+                self._stop.wait(2)
+                self._connect()
+                continue
+
+            if not raw:
+                continue  # readline timed out; staleness shows up in read()
+            try:
+                value = round(float(raw.decode('utf-8').strip()), 3)
+            except (UnicodeDecodeError, ValueError):
+                self.lines_bad += 1
+                continue
+
+            sample = (time.monotonic(), time.time(), value)
+            with self._lock:
+                self._latest = sample
+                self._ring.append(sample)
+            self.lines_ok += 1
+
+    def reading(self):
+        """Newest value with its Unix timestamp, age in seconds and stale flag."""
+        with self._lock:
+            latest = self._latest
+        if latest is None:
+            return {"value": None, "timestamp": None, "age": None, "stale": True}
+        age = time.monotonic() - latest[0]
+        return {"value": latest[2], "timestamp": latest[1], "age": round(age, 3), "stale": age > self.max_age}
+
     def read(self):
         if not self.connected:
             raise RuntimeError("ESP32 not connected")
 
-        while True:
-            raw = self.ser.readline()
-            try:
-                line = raw.decode('utf-8').strip()
-            except:
-                continue
+        r = self.reading()
+        if r["stale"]:
+            raise RuntimeError("ESP32 no data" if r["age"] is None else f"ESP32 data stale ({r['age']:.1f}s old)")
+        return r["value"]
+
+    def window(self, seconds):
+        """Aggregates over the values received in the last seconds."""
+        cutoff = time.monotonic() - seconds
+        with self._lock:
+            values = [v for t, _, v in self._ring if t >= cutoff]
+        if not values:
+            return {"count": 0, "mean": None, "min": None, "max": None}
+        return {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 3),
+            "min": min(values),
+            "max": max(values),
+        }
 
-            if line:
-                try:
-                    return round(float(line), 3)
-                except:
-                    continue
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=2)
+        if self.ser is not None:
+            self.ser.close()
 
     def status(self):
         return {
             "connected": self.connected,
             "port": self.port,
+            "age": self.reading()["age"],
             "type": "ESP32 Voltage Sensor"
         }
@@ -0,0 +1,164 @@
+"""
+Store-and-forward spool for RTU uplinks.
+
+Messages that cannot be delivered while the broker is down are kept in a
+SQLite database in WAL mode and replayed oldest-first once the link is
+back.
+
+- Appends are buffered in memory and committed as one transaction every
+  flush_interval seconds or flush_size messages, so the SD card sees a
+  few grouped writes instead of one fsync per message.
+- The stored payload bytes are capped at max_bytes. When the cap is
+  exceeded the oldest messages are evicted first.
+- take() hands out messages without waiting for delivery and is rate
+  limited by a token bucket, so a backlog does not flood the broker on
+  reconnect. Messages stay on disk until ack() confirms them, so a crash
+  mid-replay resends them instead of losing them.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+# Next to this file by default, so the spool does not depend on the working directory
+SPOOL_FILE = os.getenv(
+    "RTU_SPOOL_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool", "rtu_spool.db")
+)
+SPOOL_MAX_BYTES = int(os.getenv("RTU_SPOOL_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class Spool:
+    def __init__(self, path=SPOOL_FILE, max_bytes=SPOOL_MAX_BYTES, flush_interval=5.0, flush_size=50):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.evicted = 0
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._tokens = 0.0
+        self._last_take = time.monotonic()
+        self._taken = {}  # row id -> payload size, handed out but not yet acked
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # auto_vacuum only takes effect on a new database, before the first table exists
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT NOT NULL, payload BLOB NOT NULL, created REAL NOT NULL)"
+        )
+        self._bytes, self._count = self._db.execute(
+            "SELECT COALESCE(SUM(length(payload)), 0), COUNT(*) FROM spool"
+        ).fetchone()
+
+    def append(self, topic, payload):
+        """Queue a message for later delivery (str payloads are stored as UTF-8)."""
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        with self._lock:
+            self._buffer.append((topic, bytes(payload), time.time()))
+            due = len(self._buffer) >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Commit buffered appends in one transaction and enforce the size cap."""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._buffer:
+                return
+            rows, self._buffer = self._buffer, []
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT INTO spool (topic, payload, created) VALUES (?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+            self._bytes += sum(len(payload) for _, payload, _ in rows)
+            self._count += len(rows)
+            if self._bytes > self.max_bytes:
+                self._evict(self._bytes - self.max_bytes)
+
+    def _evict(self, excess):
+        freed = 0
+        evicted = 0
+        cutoff = None
+        for row_id, size in self._db.execute("SELECT id, length(payload) FROM spool ORDER BY id"):
+            freed += size
+            evicted += 1
+            cutoff = row_id
+            if freed >= excess:
+                break
+        if cutoff is None:
+            return
+        self._db.execute("DELETE FROM spool WHERE id <= ?", (cutoff,))
+        self._db.execute("PRAGMA incremental_vacuum")
+        self._bytes -= freed
+        self._count -= evicted
+        self._taken = {row_id: size for row_id, size in self._taken.items() if row_id > cutoff}
+        self.evicted += evicted
+        print(f"Spool over {self.max_bytes} bytes, evicted {evicted} oldest messages")
+
+    def pending(self):
+        with self._lock:
+            return self._count + len(self._buffer)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._taken)
+
+    def take(self, rate=10.0, burst=50, limit=None):
+        """
+        Hand out spooled messages oldest-first as (row_id, topic, payload).
+
+        At most rate messages per second (up to burst at once, and at most
+        limit) are returned per call; the call never sleeps. Messages already
+        taken are skipped until ack() deletes them or release() returns them.
+        """
+        now = time.monotonic()
+        self._tokens = min(float(burst), self._tokens + (now - self._last_take) * rate)
+        self._last_take = now
+        count = int(self._tokens) if limit is None else min(int(self._tokens), limit)
+        if count < 1 or not self.pending():
+            return []
+
+        self.flush()
+        with self._lock:
+            after = max(self._taken, default=0)
+            rows = self._db.execute(
+                "SELECT id, topic, payload FROM spool WHERE id > ? ORDER BY id LIMIT ?", (after, count)
+            ).fetchall()
+            for row_id, _, payload in rows:
+                self._taken[row_id] = len(payload)
+        self._tokens -= len(rows)
+        return rows
+
+    def ack(self, row_ids):
+        """Delete delivered messages in one transaction."""
+        with self._lock:
+            sizes = {row_id: self._taken.pop(row_id) for row_id in row_ids if row_id in self._taken}
+            if not sizes:
+                return
+            self._db.execute("BEGIN")
+            self._db.executemany("DELETE FROM spool WHERE id = ?", [(row_id,) for row_id in sizes])
+            self._db.execute("COMMIT")
+            self._bytes -= sum(sizes.values())
+            self._count -= len(sizes)
+
+    def release(self, row_ids=None):
+        """Return taken but unacked messages (all of them by default) so take() hands them out again."""
+        with self._lock:
+            if row_ids is None:
+                self._taken.clear()
+            for row_id in row_ids or ():
+                self._taken.pop(row_id, None)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._db.close()